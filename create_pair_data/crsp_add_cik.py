@@ -1,20 +1,20 @@
 # python '18_shares_owned/create_pair_data/crsp_add_cik.py'
 
 import pandas as pd
+from cusip_intervals import CusipIntervals
 
 # Import
 crsp_data = pd.read_csv('17_data_new/crsp_data.csv')
 crsp_data = crsp_data[['PERMNO', 'CUSIP', 'Ticker', 'PERMCO',
                        'NAICS','YYYYMMDD', 'DlyPrc', 'DlyCap',
                        'DlyVol', 'ShrOut']]
-cik_cusip_data = pd.read_csv('17_data_new/cik-cusip-maps.csv')
+# Validity intervals of the cusip6-cik pairs (cusip6 can be reassigned)
+cik_cusip_data = CusipIntervals.read('17_data_new/cik-cusip-intervals.csv')
 
-# Create a dictionary
-cik_cusip_data = dict(zip(cik_cusip_data['cusip6'], cik_cusip_data['cik']))
-
-# Create a cik column
+# Create a cik column, with the cik of the cusip6 at the date of each row
 crsp_data['CUSIP6'] = crsp_data['CUSIP'].str[:6]
-crsp_data['CIK'] = crsp_data['CUSIP6'].map(cik_cusip_data)
+dates = pd.to_datetime(crsp_data['YYYYMMDD'].astype(str), format='%Y%m%d', errors='coerce')
+crsp_data['CIK'] = cik_cusip_data.lookup(crsp_data['CUSIP6'], dates)
 crsp_data = crsp_data.dropna(subset=['CIK'])
 
 # Place cik column behind cusip column
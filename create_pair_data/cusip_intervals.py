@@ -0,0 +1,112 @@
+# As-of mapping of (cusip6, date) to cik, from the validity intervals of cik-cusip-intervals.csv written by
+# create_shares_owned/create_cusip_mapping.py (cusip6, cik, first_date, last_date, counts).
+#
+# The intervals of a cusip6 can overlap (a few filings with a wrong cik) or follow each other (cusip6
+# reassigned, issuer registered again). They are resolved into consecutive segments, each starting at a
+# date and giving the cik of the cusip6 from that date on:
+# - the cik of the interval covering the date with the most filings;
+# - in a gap between intervals, the cik of the interval that ended last;
+# - before the first filing of the cusip6, the cik of its first interval, and after its last filing, the
+#   cik of its last segment.
+# The segments are sorted by (cusip6, start) and encoded as one int64 key per segment, so the rows to map
+# are looked up all at once with numpy.searchsorted, without any Python loop over the rows.
+
+import numpy as np
+import pandas as pd
+
+# Dates are encoded as days since 1970 shifted by day_offset, the cusip6 code in the bits above.
+day_offset = 1 << 20
+code_shift = 1 << 21
+
+
+def resolve_segments(intervals):
+    """
+    This function returns the segments (cusip6, start, cik) of the intervals, sorted by cusip6 and start.
+    Argument 1: DataFrame with the columns cusip6, cik, first_date, last_date, counts.
+    """
+    single = intervals.groupby('cusip6')['cik'].transform('size') == 1
+    segments = [intervals.loc[single, ['cusip6', 'first_date', 'cik']].rename(columns={'first_date': 'start'})]
+
+    rows = []
+    for cusip6, group in intervals[~single].groupby('cusip6', sort=False):
+        group = group.sort_values(['first_date', 'cik'])
+        first = group['first_date'].to_numpy()
+        last = group['last_date'].to_numpy()
+        counts = group['counts'].to_numpy()
+        ciks = group['cik'].to_numpy()
+        # The cik can only change where an interval starts or just after one ends.
+        bounds = np.unique(np.concatenate([first, last + np.timedelta64(1, 'D')]))
+        current = None
+        for bound in bounds[bounds <= last.max()]:
+            covering = (first <= bound) & (last >= bound)
+            if covering.any():
+                i = np.argmax(np.where(covering, counts, -1))
+            else:
+                i = np.argmax(np.where(first <= bound, last, first.min()))
+            if ciks[i] != current:
+                rows.append((cusip6, bound, ciks[i]))
+                current = ciks[i]
+    segments.append(pd.DataFrame(rows, columns=['cusip6', 'start', 'cik']))
+
+    segments = pd.concat(segments, ignore_index=True)
+    segments['start'] = pd.to_datetime(segments['start'])
+    return segments.sort_values(['cusip6', 'start']).reset_index(drop=True)
+
+
+def to_days(dates):
+    """
+    Days since 1970 of a Series (or array) of datetimes, -1 for the missing dates.
+    """
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]')
+    days = dates.astype(np.int64)
+    return np.where(np.isnat(dates), -1, days + day_offset)
+
+
+class CusipIntervals:
+    """
+    The CusipIntervals object maps (cusip6, date) to the cik valid at that date.
+
+    - read: loads cik-cusip-intervals.csv.
+    - lookup: vectorized as-of lookup of columns of cusip6 and dates.
+    """
+
+    def __init__(self, intervals):
+        self.segments = resolve_segments(intervals)
+        self.cusips = pd.Index(self.segments['cusip6'].unique())
+        codes = self.cusips.get_indexer(self.segments['cusip6']).astype(np.int64)
+        self.codes = codes
+        self.keys = codes * code_shift + to_days(self.segments['start'])
+        self.ciks = self.segments['cik'].to_numpy(dtype=np.int64)
+        # First segment of each cusip6, used for the dates before its first filing.
+        self.first = np.searchsorted(codes, np.arange(len(self.cusips)))
+
+    @classmethod
+    def read(cls, path):
+        intervals = pd.read_csv(path, dtype={'cusip6': str}, parse_dates=['first_date', 'last_date'])
+        return cls(intervals)
+
+    def lookup(self, cusip6, dates):
+        """
+        This function returns the cik of each (cusip6, date), as a nullable Int64 Series, missing when
+        the cusip6 isn't in the intervals or the date is missing.
+        Argument 1: Series of cusip6.
+        Argument 2: Series of dates (datetime64).
+        """
+        index = cusip6.index if isinstance(cusip6, pd.Series) else None
+        # The distinct cusip6 are looked up once.
+        query_codes, uniques = pd.factorize(pd.Series(cusip6))
+        if len(uniques) == 0 or len(self.keys) == 0:
+            return pd.Series(pd.array([pd.NA] * len(query_codes), dtype='Int64'), index=index)
+        codes = np.where(query_codes < 0, -1, self.cusips.get_indexer(uniques)[query_codes.clip(0)])
+        days = to_days(dates)
+        found = (codes >= 0) & (days >= 0)
+
+        keys = np.where(found, codes * code_shift + days, 0)
+        position = np.searchsorted(self.keys, keys, side='right') - 1
+        # A position on the segment of another cusip6 means the date is before the first segment.
+        before = (position < 0) | (self.codes[position.clip(0)] != codes)
+        position = np.where(before, self.first[codes.clip(0)], position)
+
+        ciks = pd.array(self.ciks[position], dtype='Int64')
+        ciks[~found] = pd.NA
+        return pd.Series(ciks, index=index)
@@ -4,7 +4,7 @@
 # =============================================================================
 
 from pyspark.sql import SparkSession
-from pyspark.sql.functions import to_date, concat, lit, last, col, hash, expr, min
+from pyspark.sql.functions import to_date, concat, coalesce, lit, last, col, hash, expr, min
 from pyspark.sql.types import StringType, IntegerType
 from pyspark.sql.window import Window
 from pyspark.ml.feature import StringIndexer
@@ -93,10 +93,13 @@ spark = SparkSession.builder \
 # Start timer
 start_time = time.time()
 
-# Load shares_owned data
-shares_owned = spark.read.csv('17_data_new/shares_owned', header=True, inferSchema=True)
-shares_owned = shares_owned.withColumn('date_sample', to_date(shares_owned['date_sample'], 'MM-dd-yyyy'))
-shares_owned = shares_owned.withColumn('pair_id', hash(concat(shares_owned['cusips'], shares_owned['cik_owner'])).cast(IntegerType()))
+# Load shares_owned data, typed by scrap.py (no schema to infer), date_sample and date_issue are dates
+# (date_formatting.py)
+shares_owned = spark.read.parquet('17_data_new/shares_owned.parquet')
+# The missing cusips are null since scrap.py writes typed values, and concat of a null is null: they are
+# hashed as the former 'No CUSIP' so that each owner keeps its own pair_id (the same ids as before).
+shares_owned = shares_owned.withColumn('pair_id', hash(concat(coalesce(shares_owned['cusips'], lit('No CUSIP')),
+                                                              shares_owned['cik_owner'])).cast(IntegerType()))
 shares_owned = shares_owned.withColumnRenamed('cik', 'cik_company')  # avoids confusion
 
 # Drop column
@@ -218,9 +221,6 @@ final_data = final_data.drop('CIK_o')
 # Section 7: Clean & Export
 # =============================================================================
 
-# Modify the date_issue format
-final_data = final_data.withColumn('date_issue', to_date(final_data['date_issue'], 'MM-dd-yyyy'))
-
 # Order data
 final_data = final_data.orderBy(col("pair_id"), col("date_sample"))
 
@@ -0,0 +1,71 @@
+# python '18_shares_owned/create_shares_owned/benchmark_cover_page.py' '17_data_new/public_file_data' --limit 2000
+
+# Checks that find_cover_page returns the same values as the five find_nb_shares calls and the
+# find_percentage call it replaces in FileSec, and compares their running times. The source is
+# either a download folder (e.g. 17_data_new/13G) or a csv with a file_path column, such as
+# public_file_data. The mismatches are printed with the file path.
+
+import argparse
+import os
+import random
+import time
+import pandas as pd
+from filing_parser import FileSec, cover_page_fields, find_cover_page, find_nb_shares, find_percentage
+from filing_store import list_filings
+
+
+def former_cover_page(content):
+    """
+    The values of the cover page as computed before find_cover_page, one function call per row.
+    """
+    results = {}
+    for field, (str_match, str_not_match) in cover_page_fields.items():
+        find = find_percentage if field == 'shares_percentage' else find_nb_shares
+        results[field] = find(content, str_match, str_not_match, 20)
+    return results
+
+
+def benchmark(files):
+    former_time = 0
+    new_time = 0
+    mismatches = 0
+    for file in files:
+        content = FileSec(file).content
+
+        start = time.perf_counter()
+        former = former_cover_page(content)
+        former_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        new = find_cover_page(content)
+        new_time += time.perf_counter() - start
+
+        for field in cover_page_fields:
+            if former[field] != new[field]:
+                mismatches += 1
+                print(f'{file}: {field} {former[field]!r} != {new[field]!r}')
+
+    print(f'{len(files)} filings, {mismatches} mismatches.')
+    print(f'find_nb_shares / find_percentage: {former_time:.2f} seconds.')
+    print(f'find_cover_page: {new_time:.2f} seconds.')
+    if new_time > 0:
+        print(f'Speedup: {former_time / new_time:.1f}x')
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source', help='download folder or csv with a file_path column')
+    parser.add_argument('--limit', type=int, default=2000, help='number of filings drawn at random')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        files = list_filings(args.source)
+    else:
+        files = pd.read_csv(args.source)['file_path'].to_list()
+    random.seed(args.seed)
+    if args.limit and len(files) > args.limit:
+        files = random.sample(files, args.limit)
+
+    benchmark(files)
@@ -0,0 +1,174 @@
+# python '18_shares_owned/create_shares_owned/bulk_ingest.py' '13D' '17_data_new/13D' '17_data_new/Feed'
+
+# Offline alternative to download_files.py for historical backfills. The EDGAR daily feed archives
+# (Feed/{year}/QTR{q}/{date}.nc.tar.gz) hold every submission of a day as a .nc file. The archives are
+# read as a stream, the SC 13D/G submissions are picked out by the <TYPE> of their SGML header and
+# written in the same folder layout as download_files.py, so cusip_parser.py and scrap.py don't see
+# any difference. No request is sent to the SEC, the job is only bound by decompression.
+#
+# The .nc header uses tags (<CIK>0000012345) whereas the .txt files served by the SEC Archives use
+# labels (CENTRAL INDEX KEY:			0000012345). The header is converted to the labelled format
+# expected by the parsers, the documents are copied unchanged.
+
+import argparse
+import hashlib
+import os
+import re
+import tarfile
+from glob import glob
+from pathlib import Path
+from download_files import filing_path
+from download_ledger import DownloadLedger
+from filing_store import filing_exists
+
+header_labels = {
+    "ACCESSION-NUMBER": "ACCESSION NUMBER:\t\t",
+    "TYPE": "CONFORMED SUBMISSION TYPE:\t",
+    "PUBLIC-DOCUMENT-COUNT": "PUBLIC DOCUMENT COUNT:\t\t",
+    "PERIOD": "CONFORMED PERIOD OF REPORT:\t",
+    "FILING-DATE": "FILED AS OF DATE:\t\t",
+    "DATE-OF-FILING-DATE-CHANGE": "DATE AS OF CHANGE:\t\t",
+    "SUBJECT-COMPANY": "\nSUBJECT COMPANY:\t",
+    "FILED-BY": "\nFILED BY:\t\t",
+    "COMPANY-DATA": "\n\tCOMPANY DATA:\t",
+    "CONFORMED-NAME": "\t\tCOMPANY CONFORMED NAME:\t\t\t",
+    "CIK": "\t\tCENTRAL INDEX KEY:\t\t\t",
+    "ASSIGNED-SIC": "\t\tSTANDARD INDUSTRIAL CLASSIFICATION:\t",
+    "IRS-NUMBER": "\t\tIRS NUMBER:\t\t\t\t",
+    "STATE-OF-INCORPORATION": "\t\tSTATE OF INCORPORATION:\t\t\t",
+    "FISCAL-YEAR-END": "\t\tFISCAL YEAR END:\t\t\t",
+}
+tag_pattern = re.compile(r"<([A-Z0-9-]+)>(.*)")
+
+
+def read_header(member_file, chunk_size=1 << 14):
+    """
+    Reads a .nc submission until its first <DOCUMENT> tag.
+    Returns the header bytes and the bytes already read after it.
+    """
+    data = b""
+    while b"<DOCUMENT>" not in data:
+        chunk = member_file.read(chunk_size)
+        if not chunk:
+            break
+        data += chunk
+    position = data.find(b"<DOCUMENT>")
+    if position == -1:
+        return data, b""
+    return data[:position], data[position:]
+
+
+def parse_nc_header(header):
+    """
+    Returns the (tag, value) pairs of a .nc header, in order.
+    """
+    pairs = []
+    for line in header.decode("latin1").splitlines():
+        match = tag_pattern.match(line.strip())
+        if match:
+            pairs.append((match.group(1), match.group(2).strip()))
+    return pairs
+
+
+def first_value(pairs, tag):
+    return next((value for t, value in pairs if t == tag), None)
+
+
+def ciks_of(pairs):
+    """
+    The ciks of the subject company and of the filers, as listed in full_index (without leading zeros).
+    """
+    ciks = []
+    for tag, value in pairs:
+        if tag == "CIK" and value.isdigit() and str(int(value)) not in ciks:
+            ciks.append(str(int(value)))
+    return ciks
+
+
+def to_txt_header(pairs):
+    """
+    Converts the .nc header into the <SEC-HEADER> block of the .txt files of the SEC Archives.
+    """
+    accession = first_value(pairs, "ACCESSION-NUMBER")
+    date = first_value(pairs, "FILING-DATE")
+    lines = [f"<SEC-DOCUMENT>{accession}.txt : {date}", f"<SEC-HEADER>{accession}.hdr.sgml : {date}"]
+    for tag, value in pairs:
+        if tag not in header_labels:
+            continue
+        if tag == "ASSIGNED-SIC":
+            value = f" [{value}]"
+        lines.append(header_labels[tag] + value)
+    lines.append("</SEC-HEADER>")
+    return ("\n".join(lines) + "\n").encode("latin1")
+
+
+def ingest_archive(archive_path, filing, folder, ledger=None):
+    """
+    This function writes the submissions of one feed archive whose type contains `filing`.
+    Argument 1: .nc.tar.gz file path.
+    Argument 2: filing type, e.g. '13D'.
+    Argument 3: folder in which to write the filings, as for download_files.py.
+    Argument 4: optional DownloadLedger in which the filings written are recorded.
+    The filing is written once per cik of its header, as the index lists it once per cik. A submission
+    without an accession number or a FILING-DATE (YYYYMMDD) can't be placed in the folders, it is
+    skipped and printed.
+    Returns the number of files written and the number of submissions skipped.
+    """
+    written = []
+    skipped = 0
+    with tarfile.open(archive_path, "r|gz") as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.endswith(".nc"):
+                continue
+            member_file = archive.extractfile(member)
+            header, start = read_header(member_file)
+            pairs = parse_nc_header(header)
+            form = first_value(pairs, "TYPE") or ""
+            if filing not in form:
+                continue
+
+            accession = first_value(pairs, "ACCESSION-NUMBER")
+            date = first_value(pairs, "FILING-DATE")
+            if not accession or not re.fullmatch(r"\d{8}", date or ""):
+                print(f"{archive_path}: {member.name} skipped, accession number {accession}, filing date {date}.")
+                skipped += 1
+                continue
+            date = f"{date[0:4]}-{date[4:6]}-{date[6:8]}"
+            body = (start + member_file.read()).rstrip()
+            if body.endswith(b"</SUBMISSION>"):
+                body = body[:-len(b"</SUBMISSION>")]
+            content = to_txt_header(pairs) + body + b"</SEC-DOCUMENT>\n"
+
+            for cik in ciks_of(pairs):
+                url = f"edgar/data/{cik}/{accession}.txt"
+                file_path = filing_path({"cik": cik, "date": date, "url": url}, folder)
+                if filing_exists(file_path):
+                    continue
+                Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+                with open(file_path, "wb") as f:
+                    f.write(content)
+                written.append((accession, file_path, url, len(content), hashlib.sha256(content).hexdigest()))
+
+    if ledger is not None:
+        ledger.register((accession, file_path, filing, url) for accession, file_path, url, size, sha256 in written)
+        for accession, file_path, url, size, sha256 in written:
+            ledger.mark_done(file_path, size, sha256)
+        ledger.commit()
+    return len(written), skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filing", type=str)
+    parser.add_argument("folder", type=str)
+    parser.add_argument("feed", type=str, help="folder holding the .nc.tar.gz archives, searched recursively")
+    parser.add_argument("--ledger", type=str, default=None)
+    args = parser.parse_args()
+
+    ledger = DownloadLedger(args.ledger) if args.ledger else None
+    archives = sorted(glob(os.path.join(args.feed, "**", "*.nc.tar.gz"), recursive=True))
+    for n, archive_path in enumerate(archives):
+        written, skipped = ingest_archive(archive_path, args.filing, args.folder, ledger)
+        print(f"{n + 1} out of {len(archives)}: {archive_path}, {written} filings written, {skipped} skipped.")
+    if ledger is not None:
+        ledger.close()
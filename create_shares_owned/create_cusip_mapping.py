@@ -9,46 +9,113 @@
 # counting the frequency of each 'cik' within 'cusip6' groups. The most frequently occurring 'cik'
 # for a given 'cusip6' is assumed to represent the most accurate issuer-entity relationship. This
 # 'cik' is then selected for each 'cusip6', constructing the desired bijective map.
-
-import sys
+#
+# A cusip6 can however be reassigned, and an issuer can register again under a new cik, so the map
+# of all time is wrong for part of the history. The validity of each cusip6-cik pair is therefore also
+# written: the dates of its first and last filings (taken from the file names,
+# {cik}_{date}_{accession}.txt) and its number of filings, in cik-cusip-intervals.csv sorted by cusip6
+# and first date. create_pair_data/cusip_intervals.py maps (cusip6, date) to the cik valid at that date.
+
+import argparse
 import pandas as pd
 
-files = sys.argv[1:]
+# Date of the filing in the file name: .../2005_02/300_2005-02-10_000002.txt
+file_date = r'_(\d{4}-\d{2}-\d{2})_[^_/\\]*$'
+
+
+def read_cusips(files):
+    """
+    This function returns the cik, cusip6 and filing date of the filings parsed by cusip_parser.py.
+    Argument 1: list of the csv written by cusip_parser.py (13D.csv, 13G.csv).
+    """
+    df = [pd.read_csv(f, names=['f', 'cik', 'cik_owner', 'cusip'], dtype=str) for f in files]
+    return clean_cusips(pd.concat(df))
+
+
+def clean_cusips(df):
+    """
+    This function returns the cik, cusip6 and filing date of rows of cusip_parser.py.
+    Argument 1: DataFrame with the columns f, cik, cik_owner and cusip, as str.
+    """
+    # The next line is important to remove cases of financial institution that for a given asset
+    # file 13D/G as owner and subject company.
+    # Renaissance technology LLC as example: 17_data_new/13G\2009_02\1037389_2009-02-12_000022.txt
+    df = df[df['cik'] != df['cik_owner']]
+
+    df = df[['f', 'cik', 'cusip']].dropna()
+
+    df['leng'] = df.cusip.map(len)
+
+    df = df[(df.leng == 6) | (df.leng == 8) | (df.leng == 9)]
+
+    df['cusip6'] = df.cusip.str[:6]
+
+    df = df[df.cusip6 != '000000']
+    df = df[df.cusip6 != '0001pt']
+
+    # df['cusip8'] = df.cusip.str[:8]
+    # df = df[df['cusip8'].str.len() == 8]
+
+    df.cik = pd.to_numeric(df.cik)
+    df['date'] = pd.to_datetime(df.f.str.extract(file_date, expand=False), format='%Y-%m-%d', errors='coerce')
+
+    return df[['cik', 'cusip6', 'date']]
 
-df = [pd.read_csv(f, names=['f', 'cik', 'cik_owner', 'cusip'], dtype=str) for f in files]
-df = pd.concat(df)
 
-# The next line is important to remove cases of financial institution that for a given asset
-# file 13D/G as owner and subject company.
-# Renaissance technology LLC as example: 17_data_new/13G\2009_02\1037389_2009-02-12_000022.txt
-df = df[df['cik'] != df['cik_owner']]
+def pair_counts(df):
+    """
+    This function returns, for each cusip6-cik pair, its number of filings (counts) and the dates of its
+    first and last filings (first_date, last_date, NaT if none of its file names has a date).
+    Argument 1: output of clean_cusips.
+    """
+    return df.groupby(['cusip6', 'cik'])['date']\
+        .agg(counts='size', first_date='min', last_date='max').reset_index()
 
-df = df[['cik', 'cusip']].dropna()
 
-df['leng'] = df.cusip.map(len)
+def merge_pair_counts(pairs, other):
+    """
+    This function merges the pair_counts of two sets of filings.
+    """
+    if pairs is None:
+        return other
+    return pd.concat([pairs, other]).groupby(['cusip6', 'cik'])\
+        .agg(counts=('counts', 'sum'), first_date=('first_date', 'min'), last_date=('last_date', 'max'))\
+        .reset_index()
 
-df = df[(df.leng == 6) | (df.leng == 8) | (df.leng == 9)]
 
-df['cusip6'] = df.cusip.str[:6]
+def most_frequent_cik(pairs):
+    """
+    This function returns the most frequent cik of each cusip6, with its number of filings.
+    Argument 1: output of pair_counts.
+    """
+    # The occurrences of each 'cik' within each 'cusip6' group, counted by pair_counts.
+    counts = pairs[['cusip6', 'cik', 'counts']]
 
-df = df[df.cusip6 != '000000']
-df = df[df.cusip6 != '0001pt']
+    # Sort within each 'cusip6' group by 'counts' in descending order, so the most frequent 'cik' comes first.
+    # Then, drop duplicates to keep only the most frequent 'cik' for each 'cusip6'.
+    most_frequent = counts.sort_values(['cusip6', 'counts'], ascending=[True, False])\
+        .drop_duplicates('cusip6').reset_index(drop=True)
+    return most_frequent
 
-# df['cusip8'] = df.cusip.str[:8]
-# df = df[df['cusip8'].str.len() == 8]
 
-df.cik = pd.to_numeric(df.cik)
+def cusip_intervals(pairs):
+    """
+    This function returns the validity interval of each cusip6-cik pair: the dates of its first and
+    last filings (first_date, last_date) and its number of filings (counts), sorted by cusip6 and
+    first_date. The pairs without a date in the names of their files are left out.
+    Argument 1: output of pair_counts.
+    """
+    intervals = pairs.dropna(subset=['first_date'])[['cusip6', 'cik', 'first_date', 'last_date', 'counts']]
+    return intervals.sort_values(['cusip6', 'first_date', 'cik']).reset_index(drop=True)
 
-# Start by selecting only the 'cik' and 'cusip6' columns.
-df = df[['cik', 'cusip6']]
 
-# Group by 'cusip6' and 'cik', then count the occurrences of each 'cik' within each 'cusip6' group.
-counts = df.groupby(['cusip6', 'cik']).size().reset_index(name='counts')
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='+', help='csv written by cusip_parser.py')
+    args = parser.parse_args()
 
-# Sort within each 'cusip6' group by 'counts' in descending order, so the most frequent 'cik' comes first.
-# Then, drop duplicates to keep only the most frequent 'cik' for each 'cusip6'.
-most_frequent = counts.sort_values(['cusip6', 'counts'], ascending=[True, False])\
-    .drop_duplicates('cusip6').reset_index(drop=True)
+    pairs = pair_counts(read_cusips(args.files))
 
-# Save the resulting DataFrame to a CSV file.
-most_frequent.to_csv('17_data_new/cik-cusip-maps.csv', index=False)
+    # Save the resulting DataFrame to a CSV file.
+    most_frequent_cik(pairs).to_csv('17_data_new/cik-cusip-maps.csv', index=False)
+    cusip_intervals(pairs).to_csv('17_data_new/cik-cusip-intervals.csv', index=False, date_format='%Y-%m-%d')
@@ -1,97 +1,285 @@
 # python '18_shares_owned/dl_idx.pl(1).py'
 
-import csv
-import io
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import pandas as pd
 import requests
-from datetime import datetime
-import os
+from filing_index import compact_partitions, read_index, to_frame, write_frame
 
 
 user_agent = {"User-agent": "Mozilla/5.0"}
+index_url = "https://www.sec.gov/Archives/edgar/full-index/{year}/QTR{q}/master.idx"
 
 
-def most_recent_year(csv_file, default_year):
+class RateLimiter:
     """
-    This function finds the most recent year in the current full_index.csv file.
-    Argument 1: full_index.csv file path.
-    Argument 2: default date if full_index.csv doesn't exist.
+    Thread-safe limiter spacing requests so that no more than max_requests_per_second
+    requests are sent to the SEC, whatever the number of threads sharing it.
     """
-    try:
-        df = pd.read_csv(csv_file, parse_dates=['date'], encoding='latin1')
 
-        if df.empty:
-            return default_year
+    def __init__(self, max_requests_per_second=10):
+        self.interval = 1 / max_requests_per_second
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            sleep_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if sleep_time > 0:
+            time.sleep(sleep_time)
 
-        most_recent_date = df['date'].max()
 
-        if pd.isnull(most_recent_date):
-            return default_year
+def quarter_key(year, q):
+    return f"{year}-QTR{q}"
 
-        return int(most_recent_date.strftime('%Y'))
 
+def load_manifest(manifest_path):
+    """
+    This function loads the manifest of the quarters already ingested in full_index.csv.
+    Argument 1: index_manifest.json file path.
+    Each entry is keyed by 'YYYY-QTRq' and stores the content length and the sha256 checksum
+    of the master.idx file that was ingested, the number of rows added and the sync time.
+    """
+    try:
+        with open(manifest_path, "r") as f:
+            return json.load(f)
     except FileNotFoundError:
-        return default_year
+        return {}
+
+
+def save_manifest(manifest, manifest_path):
+    """
+    The manifest is written to a temporary file first and then renamed, so that a crash
+    never leaves a truncated manifest behind.
+    """
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def all_quarters(start_year, today):
+    """
+    Returns every (year, quarter) from start_year up to the quarter containing today.
+    """
+    current = (today.year, (today.month - 1) // 3 + 1)
+    return [(year, q) for year in range(start_year, today.year + 1) for q in range(1, 5)
+            if (year, q) <= current]
+
+
+def quarters_to_check(manifest, quarters, recheck=False):
+    """
+    Selects the quarters whose master.idx has to be compared with the manifest.
+    Quarters never ingested are always checked. Among the ingested ones, only the two most
+    recent are checked (the current quarter keeps growing and late filings can still be
+    added to the previous one), unless recheck is True.
+    """
+    if recheck:
+        return list(quarters)
+    ingested = [yq for yq in quarters if quarter_key(*yq) in manifest]
+    recent = set(ingested[-2:])
+    return [yq for yq in quarters if quarter_key(*yq) not in manifest or yq in recent]
 
 
-def update_csv_with_new_data(existing_file_path, new_data_io):
+def remote_length(session, limiter, year, q):
     """
-    This function will update the existing fil full_index.cdv.
-    If full_index.csv doesn't exist, it is created.
-    Argument 1: file_path of full_index.csv.
-    Argument 2: fictive file with new data.
-    new_data_io should be a dataset filled with the most recent
-    SEC filings. This function compares if the filing in
-    new_data_io are already present in the existing file, if
-    not these are added.
+    Returns the Content-Length of a master.idx file with a HEAD request, or None if the
+    server doesn't provide it. The encoding is forced to identity so that the length is the
+    one of the raw file, as stored in the manifest.
     """
-    existing_data = set()
+    limiter.wait()
+    response = session.head(index_url.format(year=year, q=q),
+                            headers={**user_agent, "Accept-Encoding": "identity"}, timeout=60)
+    if response.status_code != 200 or "Content-Length" not in response.headers:
+        return None
+    return int(response.headers["Content-Length"])
 
-    if os.path.exists(existing_file_path):
-        with open(existing_file_path, mode='r', newline='', encoding='latin1') as file:
-            reader = csv.reader(file)
-            existing_data = set(tuple(row) for row in reader)
 
-    new_data_io.seek(0)
+class IndexStream:
+    """
+    Iterates over the rows [cik, comnam, form, date, url] of a master.idx HTTP response while
+    the body is being received. The content length and the sha256 checksum are computed on the
+    fly, so the payload is never held in memory nor written to an intermediate file.
+    """
+
+    def __init__(self, response, chunk_size=1 << 16):
+        self.response = response
+        self.chunk_size = chunk_size
+        self.length = 0
+        self.digest = hashlib.sha256()
+
+    def __iter__(self):
+        pending = b""
+        for chunk in self.response.iter_content(chunk_size=self.chunk_size):
+            self.length += len(chunk)
+            self.digest.update(chunk)
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                if b".txt" in line:
+                    yield line.decode("latin1").strip().split("|")
+        if b".txt" in pending:
+            yield pending.decode("latin1").strip().split("|")
+
+
+def quarter_bounds(year, q):
+    start = pd.Timestamp(year=year, month=3 * q - 2, day=1)
+    return start, start + pd.offsets.QuarterEnd(0)
+
+
+def existing_keys(store, year, q):
+    """
+    This function returns the (accession, cik) keys already in the columnar index for a quarter.
+    A filing is listed in master.idx once per cik involved (subject company and filer), so the
+    accession number alone doesn't identify a row. Only these two integer columns of the rows
+    dated in the quarter are loaded, which bounds the memory by one quarter of the index.
+    """
+    start, end = quarter_bounds(year, q)
+    df = read_index(store, start=start, end=end, columns=["accession", "cik"])
+    return pd.MultiIndex.from_arrays([df["accession"], df["cik"]])
+
+
+def ingest_quarter(session, limiter, lock, year_lock, store, csv_file, year, q, previous=None,
+                   batch_size=100_000):
+    """
+    This function streams one master.idx into the columnar index (and full_index.csv if
+    csv_file is given), by batches of batch_size rows. Rows whose (accession, cik) key is
+    already known are dropped. The keys are read and the rows written while holding year_lock,
+    the lock of the partitions of that year, which the other quarter of the same year and the
+    compaction of these partitions also use.
+    When the quarter was already ingested, previous is the sha256 stored in the manifest: the rows
+    are then held until the whole response is read, and if its checksum is unchanged nothing is
+    written and the keys of the index aren't even loaded.
+    Returns the content length, the checksum and the number of rows added.
+    """
+    known = None
+    added = 0
+
+    def flush(rows):
+        nonlocal known, added
+        df = to_frame(rows)
+        with year_lock:
+            if known is None:
+                known = existing_keys(store, year, q)
+            keys = pd.MultiIndex.from_arrays([df["accession"], df["cik"]])
+            new = ~keys.isin(known) & ~keys.duplicated()
+            if not new.any():
+                return
+            df = df[new]
+            known = known.append(keys[new])
+            added += len(df)
+            write_frame(df, store)
+        if csv_file is not None:
+            with lock, open(csv_file, mode="a", newline="", encoding="latin1") as f:
+                df.assign(date=df["date"].dt.strftime("%Y-%m-%d")).to_csv(
+                    f, columns=["cik", "comnam", "form", "date", "url"], header=f.tell() == 0, index=False)
+
+    limiter.wait()
+    with session.get(index_url.format(year=year, q=q), headers=user_agent, timeout=300, stream=True) as response:
+        response.raise_for_status()
+        stream = IndexStream(response)
+        rows = []
+        for row in stream:
+            rows.append(row)
+            if previous is None and len(rows) >= batch_size:
+                flush(rows)
+                rows = []
+    checksum = stream.digest.hexdigest()
+    if checksum == previous:
+        return stream.length, checksum, 0
+    for i in range(0, len(rows), batch_size):
+        flush(rows[i:i + batch_size])
+    return stream.length, checksum, added
+
+
+def sync_index(store, manifest_path, csv_file=None, start_year=1993, workers=4, recheck=False):
+    """
+    This function brings the filing index up to date with the SEC full-index.
+    (1) The quarters that are new, or whose Content-Length differs from the manifest, are selected.
+    (2) Those quarters are streamed concurrently, within the SEC rate limit, straight into the
+        columnar index (see filing_index.py). A quarter already ingested whose checksum is
+        unchanged is skipped, otherwise only the rows that aren't already present are appended,
+        to the index and to full_index.csv.
+    (3) The partitions of the year of each quarter are compacted once it is ingested, and the
+        manifest is updated. A quarter whose download fails is left out of the manifest, and the
+        other quarters are still synced.
+    Argument 1: directory of the columnar index.
+    Argument 2: index_manifest.json file path.
+    Argument 3: full_index.csv file path, None to only update the columnar index.
+    """
+    manifest = load_manifest(manifest_path)
+    quarters = quarters_to_check(manifest, all_quarters(start_year, datetime.now()), recheck)
+    limiter = RateLimiter()
+    lock = threading.Lock()
+    year_locks = {year: threading.Lock() for year in {year for year, q in quarters}}
+
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=workers) as executor:
 
-    reader = csv.reader(new_data_io)
-    new_data_set = set(tuple(row) for row in reader)
+        def is_stale(yq):  # (1)
+            entry = manifest.get(quarter_key(*yq))
+            if entry is None:
+                return True
+            try:
+                length = remote_length(session, limiter, *yq)
+            except requests.RequestException as e:
+                # Left as it is, the quarter is checked again by the next run.
+                print(*yq, f"not checked: {e!r}")
+                return False
+            return length is None or length != entry["content_length"]
 
-    data_to_add = [row for row in new_data_set if row not in existing_data]
+        stale = [yq for yq, changed in zip(quarters, executor.map(is_stale, quarters)) if changed]
+        print(f"{len(stale)} quarter(s) to fetch out of {len(quarters)} checked.")
 
-    with open(existing_file_path, mode='a', newline='', encoding='latin1') as file:
-        writer = csv.writer(file)
+        def sync_quarter(yq):  # (2)
+            year, q = yq
+            key = quarter_key(year, q)
+            previous = manifest.get(key, {}).get("sha256")
+            try:
+                length, checksum, added = ingest_quarter(session, limiter, lock, year_locks[year], store, csv_file,
+                                                         year, q, previous)
+            except requests.RequestException as e:
+                # The manifest isn't updated, so the next run fetches the quarter again. The rows already
+                # written are then found in the index and not added twice.
+                print(year, q, f"failed: {e!r}")
+                return False
+            if added:  # (3)
+                with year_locks[year]:
+                    compact_partitions(store, years={year})
+            with lock:
+                manifest[key] = {
+                    "content_length": length,
+                    "sha256": checksum,
+                    "rows": manifest.get(key, {}).get("rows", 0) + added,
+                    "synced": datetime.now().isoformat(timespec="seconds"),
+                }
+                save_manifest(manifest, manifest_path)
+            print(year, q, "unchanged" if checksum == previous else f"{added} new filings")
+            return True
 
-        if file.tell() == 0 and any(data_to_add):
-            writer.writerow(["cik", "comnam", "form", "date", "url"])  # Adjust headers as needed
-        writer.writerows(data_to_add)
+        failed = [yq for yq, synced in zip(stale, executor.map(sync_quarter, stale)) if not synced]
+        if failed:
+            print(f"{len(failed)} quarter(s) failed, they are fetched again by the next run: {failed}")
 
 
-# (1) master.idx file is created or overwritten with the current year sec filing indexes.
-# (2) A fictive csv file is created where the .txt file present in master.idx are written.
-# (3) Last year sec file indexes are added to the current full_index.csv if not already present.
+# Only the quarters that are new or changed since the last run are downloaded, see sync_index.
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", default=r"17_data_new\full_index")
+    parser.add_argument("--manifest", default=r"17_data_new\index_manifest.json")
+    parser.add_argument("--csv", default=r"17_data_new\full_index.csv",
+                        help="full_index.csv kept up to date along with the columnar index, '' to disable")
+    parser.add_argument("--start-year", type=int, default=1993)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--recheck", action="store_true",
+                        help="compare every quarter with the manifest, not only the most recent ones")
+    args = parser.parse_args()
 
-    with open(f"17_data_new\master.idx", "wb") as f:  # (1)
-
-        start = most_recent_year(r"17_data_new\full_index.csv", 1993)
-        end = datetime.now().year
-        for year in range(start, end + 1):
-            for q in range(1, 5):
-                print(year, q)
-                content = requests.get(
-                    f"https://www.sec.gov/Archives/edgar/full-index/{year}/QTR{q}/master.idx",
-                    headers=user_agent,
-                ).content
-                f.write(content)
-
-    fictive_file = io.StringIO()  # (2)
-    wr = csv.writer(fictive_file)
-    wr.writerow(["cik", "comnam", "form", "date", "url"])
-
-    with open(r"17_data_new\master.idx", "r", encoding="latin1") as f:
-        for r in f:
-            if ".txt" in r:
-                wr.writerow(r.strip().split("|"))
-
-    update_csv_with_new_data(r'17_data_new\full_index.csv',fictive_file)  # (3)
\ No newline at end of file
+    sync_index(args.store, args.manifest, args.csv or None, args.start_year, args.workers, args.recheck)
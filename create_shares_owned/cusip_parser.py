@@ -1,90 +1,185 @@
 # python '18_shares_owned/all_cik.py' '17_data_new\13D'
 import argparse
 import csv
+import io
+import os
 import re
-import sys
 from collections import *
-from glob import glob
-from multiprocessing import Pool
+from functools import partial
 from pathlib import Path
-
-parser = argparse.ArgumentParser()
-parser.add_argument('files')
-parser.add_argument('--debug', action='store_true')
-
-args = parser.parse_args()
+from download_ledger import DownloadLedger
+from filing_store import filing_exists, filing_mtimes, open_filing
+from parse_executor import ParseExecutor
+from sec_header import read_sec_header
 
 pat = re.compile(
     '[\( >]*[0-9A-Z]{1}[0-9]{3}[0-9A-Za-z]{2}[- ]*[0-9]{0,2}[- ]*[0-9]{0,1}[\) \n<]*'
 )
 w = re.compile('\w+')
+# Heading of Item 3 ('Item 3.', 'ITEM 3:'). The cover page and the first items (13G filings repeat the
+# CUSIP in Item 2(e)) are over once it is reached.
+end_of_cover = re.compile(r'(^|>)\s*item\s+3\s*[.(:]', re.IGNORECASE)
 
 
-def parse(file):
-    with open(file, 'r') as f:
-        lines = f.readlines()
-
-    record = 0
-    cik = None
-    for line in lines:
-        if 'SUBJECT COMPANY' in line:
-            record = 1
-        if 'CENTRAL INDEX KEY' in line and record == 1:
-            cik = line.split('\t\t\t')[-1].strip()
-            break
-    record = 0
-    cik_owner = None
-    for line in lines:
-        if 'FILED BY' in line:
-            record = 1
-        if 'CENTRAL INDEX KEY' in line and record == 1:
-            cik_owner = line.split('\t\t\t')[-1].strip()
-            break
-
+def parse(file, max_lines=None, max_bytes=1_000_000, debug=False):
+    """
+    Single pass over a filing:
+    - The cik of the subject company and the cik of the first owner (FILED BY) are read from the
+      SEC header by read_sec_header, which only decodes the header bytes.
+    - From the first <DOCUMENT>, read line by line from the end of the header, the CUSIP
+      candidates are collected on the cover page. The scan
+      stops at the end of the main document (</DOCUMENT>, the exhibits follow), at the Item 3
+      heading, or once max_lines lines / max_bytes characters of the document have been read.
+    The most common candidate is returned as cusip.
+    """
+    header = read_sec_header(file)
+    cik = header['subject_company']['cik'] if header['subject_company'] else None
+    cik_owner = header['filed_by'][0]['cik'] if header['filed_by'] else None
     cusips = []
-    record = 0
-    for line in lines:
-        if '<DOCUMENT>' in line:  # lines are after the document preamble
-            record = 1
-        if record == 1:
+    in_document = False
+    nb_lines = 0
+    nb_bytes = 0
+
+    with open_filing(file, 'rb') as raw:
+        raw.seek(header['end'] or 0)
+        f = io.TextIOWrapper(raw)
+        for line in f:
+            if not in_document:
+                if '<DOCUMENT>' not in line:
+                    continue
+                in_document = True  # lines are after the document preamble
+
+            nb_lines += 1
+            nb_bytes += len(line)
+            # An HTML filing can hold its whole cover page and the Item 3 heading on a single line: the
+            # text before the end of the cover is still scanned.
+            end = len(line)
+            if '</DOCUMENT>' in line:
+                end = line.index('</DOCUMENT>')
+            match = end_of_cover.search(line, 0, end)
+            if match:
+                end = match.start()
+            last = end < len(line)
+            line = line[:end]
             if 'IRS' not in line and 'I.R.S' not in line:
                 fd = pat.findall(line)
                 if fd:
                     cusip = fd[0].strip().strip('<>')
-                    if args.debug:
+                    if debug:
                         print('INFO: added --- ', line, " --- extracted [",
                               cusip, "]")
                     cusips.append(cusip)
+            if last:
+                break
+            if (max_lines is not None and nb_lines >= max_lines) or \
+                    (max_bytes is not None and nb_bytes >= max_bytes):
+                break
+
     if len(cusips) == 0:
         cusip = None
     else:
         cusip = Counter(cusips).most_common()[0][0]
         cusip = ''.join(w.findall(cusip))
-    if args.debug:
+    if debug:
         print(cusip)
 
     return [file, cik, cik_owner, cusip]
 
 
+def load_state(state_path):
+    """
+    The state file lists the filings already in the output with their modification time.
+    """
+    try:
+        with open(state_path, 'r', newline='') as f:
+            return {row[0]: float(row[1]) for row in csv.reader(f)}
+    except FileNotFoundError:
+        return {}
+
+
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files')
+    parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--ledger', help='download ledger listing the filings, instead of walking the folder')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only parse the filings that are new or changed since the last run')
+    parser.add_argument('--max-lines', type=int, default=None,
+                        help='lines of the document scanned for the CUSIP at most')
+    parser.add_argument('--max-bytes', type=int, default=1_000_000,
+                        help='characters of the document scanned for the CUSIP at most')
+    parser.add_argument('--workers', type=int, default=5, help='number of worker processes')
+    parser.add_argument('--chunksize', type=int, default=100, help='number of filings sent to a worker at once')
+    parser.add_argument('--timeout', type=float, default=120,
+                        help='seconds a filing can take before its worker is replaced and the filing quarantined')
+    parser.add_argument('--max-tasks-per-child', type=int, default=10000,
+                        help='number of filings after which a worker is replaced')
+    parser.add_argument('--max-memory', type=int, default=None,
+                        help='memory of a worker in bytes above which it is replaced (requires psutil)')
+    args = parser.parse_args()
+
     if args.debug:
-        path = Path(args.files)
-        if path.exists():
-            print(parse(args.files))
+        if filing_exists(args.files):
+            print(parse(args.files, args.max_lines, args.max_bytes, debug=True))
         else:
             raise ValueError("provide a single file to debug ...")
         return
 
-    i = 0
-    with Pool(5) as p:
-        with open(args.files + '.csv', 'w') as w:
-            wr = csv.writer(w)
-            all_files = glob(args.files + '/*/*')
-            for res in p.imap(parse, all_files, chunksize=100):
-                print(f'{i} on {len(all_files)}.')
-                i += 1
-                wr.writerow(res)
+    output_path = args.files + '.csv'
+    state_path = args.files + '.state.csv'
+    # The filings that timed out or crashed a worker during the last run. They aren't in the state
+    # file, so an incremental run tries them again.
+    quarantine_path = args.files + '.quarantine.csv'
+    if os.path.exists(quarantine_path):
+        os.remove(quarantine_path)
+
+    if args.ledger:
+        ledger = DownloadLedger(args.ledger)
+        # The time of the download recorded in the ledger stands for the modification time, so the
+        # filings aren't stat-ed one by one.
+        mtimes = ledger.download_times(Path(args.files).name)
+        ledger.close()
+    else:
+        mtimes = filing_mtimes(args.files)
+
+    # A filing is parsed again when its modification time moved by more than the 2 seconds
+    # resolution of the shards (a filing packed after the last run keeps its output).
+    state = load_state(state_path) if args.incremental and os.path.exists(output_path) else {}
+    all_files = [file for file, mtime in mtimes.items()
+                 if file not in state or abs(state[file] - mtime) > 2]
+    print(f'{len(mtimes)} filings, {len(all_files)} to parse.')
+
+    # The output is written to a temporary file renamed at the end, so an interrupted run leaves
+    # the previous output untouched. The rows of the filings parsed again, or no longer present,
+    # are not copied over.
+    written = []
+    parsed = set(all_files)
+    tmp_path = output_path + '.tmp'
+    executor = ParseExecutor(partial(parse, max_lines=args.max_lines, max_bytes=args.max_bytes),
+                             workers=args.workers, timeout=args.timeout, chunksize=args.chunksize,
+                             max_tasks_per_child=args.max_tasks_per_child, max_memory=args.max_memory,
+                             quarantine_path=quarantine_path)
+    with open(tmp_path, 'w', newline='') as out:
+        wr = csv.writer(out)
+        if state:
+            with open(output_path, 'r', newline='') as f:
+                for row in csv.reader(f):
+                    if row and row[0] in mtimes and row[0] not in parsed:
+                        wr.writerow(row)
+                        written.append(row[0])
+        for i, res in enumerate(executor.imap_unordered(all_files)):
+            print(f'{i} on {len(all_files)}.')
+            wr.writerow(res)
+            written.append(res[0])
+    os.replace(tmp_path, output_path)
+    if executor.quarantined:
+        print(f'{executor.quarantined} filings quarantined, see {quarantine_path}.')
+
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        csv.writer(f).writerows([file, mtimes[file]] for file in written)
+    os.replace(tmp_path, state_path)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,49 +1,68 @@
 import pandas as pd
-from datetime import datetime
+import pyarrow as pa
 
+# Formats of the transaction dates found by find_transaction_date, tried in this order on the dates
+# not parsed yet: 'December 30, 1993', 'Dec 30, 1993', '12/30/1993', '12/30/93'.
+transaction_formats = ["%B %d, %Y", "%b %d, %Y", "%m/%d/%Y", "%m/%d/%y"]
+issue_format = "%m-%d-%Y"
+# Dates outside these years are misspellings ('April 12, 1006' for 'April 12, 2006').
+first_year = 1900
+last_year = 2100
 
-def date_formatting(date):
+
+def parse_dates(dates, date_formats):
     """
-    December 30, 1993 -> 12-30-1993
+    This function converts a column of dates written as text to datetimes, NaT where no format matches.
+    Argument 1: Series of str, None where missing (or of dates, returned as datetimes).
+    Argument 2: list of formats tried one after the other on the whole column.
     """
-    date_formats = [
-        "%B %d, %Y",
-        "%b %d, %Y",
-    ]
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return pd.to_datetime(dates)
+    # Each distinct value is parsed once (many filings have the same date).
+    codes, uniques = pd.factorize(dates)
+    uniques = pd.Series(uniques, dtype=object)
+    is_text = uniques.map(lambda value: isinstance(value, str))
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[us]')
+    # Values that are already dates (date32 column of a former run).
+    parsed[~is_text] = pd.to_datetime(uniques[~is_text], errors='coerce')
+    # 'January 28 , 2002' -> 'January 28, 2002', 'January 28 and 29, 2002' -> 'January 28, 2002'
+    text = (uniques[is_text].astype('string')
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.replace(r'\s+and\s*\d{1,2}', '', regex=True)
+            .str.replace(r'\s*,\s*', ', ', regex=True)
+            .str.strip())
     for date_format in date_formats:
-        try:
-            parsed_date = datetime.strptime(date, date_format)
-            formatted_date = parsed_date.strftime('%m-%d-%Y')
-            return formatted_date
-        except ValueError:
-            return 'no match'
+        missing = text.index[parsed[text.index].isna()]
+        if missing.empty:
+            break
+        parsed[missing] = pd.to_datetime(text[missing], format=date_format, errors='coerce')
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=dates.index)
 
 
-def sample_date(date, date_issue):
+def sample_dates(date_transaction, date_issue):
     """
-    If the argument date is in this format 'December 30, 1993' then it returns 12-30-1993, if not
-    the argument date_issue is returned. This is done by checking if the function pd.to_datetime()
-    returns a date and not NAT. This will be case each time 'no match' is encountered. And in really
-    rare cases, misspelling of the transaction date like 'April 12, 1006' for 'April 12, 2006' makes
-    the conversion to date type impossible.
+    This function returns the date of each filing: its transaction date ('December 30, 1993',
+    '12/30/93', ...) when it is found and valid, its issue date otherwise.
+    Argument 1: Series of the transaction dates.
+    Argument 2: Series of the issue dates (12-30-1993).
     """
-    date_out = date_formatting(date)
-    date_out = pd.to_datetime(date_out, format='%m-%d-%Y', errors='coerce')
-    if pd.isna(date_out):
-        return date_issue
-    else:
-        date_out = date_out.strftime('%m-%d-%Y')
-        return date_out
+    transaction = parse_dates(date_transaction, transaction_formats)
+    valid = transaction.dt.year.between(first_year, last_year)
+    issue = parse_dates(date_issue, [issue_format])
+    return transaction.where(valid, issue)
 
 
 if __name__ == '__main__':
     # python '18_shares_owned/create_shares_owned/date_formatting.py'
-    shares_owned = pd.read_csv('17_data_new/shares_owned')
-    shares_owned['date_sample'] = shares_owned.apply(lambda row: sample_date(row['date_transaction'],
-                                                                             row['date_issue']), axis=1)
+    # The nullable dtypes keep the numbers of shares and the ciks as integers.
+    shares_owned = pd.read_parquet('17_data_new/shares_owned.parquet', dtype_backend='numpy_nullable')
+    shares_owned['date_sample'] = sample_dates(shares_owned['date_transaction'], shares_owned['date_issue'])
+    shares_owned['date_issue'] = parse_dates(shares_owned['date_issue'], [issue_format])
+    # Stored as dates (date32), read as dates by pandas and spark.
+    for column in ['date_issue', 'date_sample']:
+        shares_owned[column] = shares_owned[column].astype(pd.ArrowDtype(pa.date32()))
     # Places date_sample column behind date_transaction
     index_of_date_transaction = shares_owned.columns.get_loc('date_transaction')
     date_sample_column = shares_owned.pop('date_sample')
     shares_owned.insert(index_of_date_transaction + 1, 'date_sample', date_sample_column)
-    shares_owned.to_csv('17_data_new/shares_owned')
-
+    shares_owned.to_parquet('17_data_new/shares_owned.parquet', index=False)
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import locale
+import os
+import random
+import time
+from pathlib import Path
+import aiohttp
+
+
+sec_archives = "https://www.sec.gov/Archives"
+user_agent = {"User-agent": "Mozilla/5.0"}
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all the download tasks. Tokens are added at `rate` per second up to
+    `capacity`, and each request takes one. With the default capacity of 1 the requests are
+    evenly spaced, so the SEC limit of 10 requests per second is never exceeded, even in bursts.
+    """
+
+    def __init__(self, rate=10, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class DownloadError(Exception):
+    def __init__(self, message, retryable):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def backoff_delay(attempt, base=1, cap=60, retry_after=None):
+    """
+    Exponential backoff with full jitter: a random delay between 0 and min(cap, base * 2**attempt).
+    A Retry-After header sent by the server takes precedence.
+    """
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def write_filing(file_path, txt):
+    """
+    Writes the text of a filing as download_files.py always did (open(file_path, "w", errors="ignore")
+    encodes it and translates the new lines), and returns the size in bytes and the sha256 checksum of
+    the file, computed on the bytes written so the file isn't read again.
+    """
+    data = txt.replace("\n", os.linesep).encode(locale.getpreferredencoding(False), errors="ignore")
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(data)
+    return len(data), hashlib.sha256(data).hexdigest()
+
+
+async def fetch_filing(session, bucket, url, file_path, max_retries=5):
+    """
+    Downloads one filing and writes it to file_path, in a thread so the event loop isn't blocked.
+    429 and 5xx responses, timeouts and connection errors are retried up to max_retries times with
+    backoff_delay. Other statuses (e.g. 404) and errors writing the file fail at once. Returns the
+    size of the file in bytes and its sha256 checksum. Raises DownloadError when the filing couldn't
+    be downloaded.
+    """
+    for attempt in range(max_retries + 1):
+        await bucket.acquire()
+        retry_after = None
+        try:
+            async with session.get(url) as response:
+                if response.status == 200:
+                    txt = await response.text(errors="ignore")
+                    try:
+                        return await asyncio.to_thread(write_filing, file_path, txt)
+                    except OSError as e:
+                        # Disk full, permissions: sending the request again doesn't help, only this
+                        # filing fails and it is downloaded again by the next run.
+                        raise DownloadError(f"write failed: {e!r}", retryable=False)
+                if response.status != 429 and response.status < 500:
+                    raise DownloadError(f"HTTP {response.status}", retryable=False)
+                error = DownloadError(f"HTTP {response.status}", retryable=True)
+                retry_after = response.headers.get("Retry-After")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = DownloadError(repr(e), retryable=True)
+        if attempt < max_retries:
+            await asyncio.sleep(backoff_delay(attempt, retry_after=retry_after))
+    raise error
+
+
+async def download_filings(jobs, base_url=sec_archives, rate=10, concurrency=8, max_retries=5,
+                           retry_rounds=3, round_pause=30, on_result=None):
+    """
+    This function downloads filings concurrently over a pooled keep-alive session.
+    Argument 1: list of (url, file_path), url being relative to base_url (as in full_index).
+    Argument 2: root of the archives. A local server can be given to test the engine.
+    The number of requests per second is held by a TokenBucket and at most `concurrency`
+    requests are in flight. Filings failing with a retryable error are put in a failed queue
+    which is downloaded again, up to retry_rounds times, after a pause of round_pause seconds.
+    on_result(url, file_path, size, sha256, error) is called after each filing, error being None on
+    success.
+    Returns the list of (url, file_path, error) that still failed.
+    """
+    bucket = TokenBucket(rate)
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=60)
+    pending = list(jobs)
+    given_up = []
+
+    async with aiohttp.ClientSession(connector=connector, headers=user_agent, timeout=timeout) as session:
+        for round_nb in range(retry_rounds + 1):
+            queue = asyncio.Queue()
+            for job in pending:
+                queue.put_nowait(job)
+            failed = []
+
+            async def worker():
+                while True:
+                    try:
+                        url, file_path = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    try:
+                        size, sha256 = await fetch_filing(session, bucket, f"{base_url}/{url}", file_path,
+                                                          max_retries)
+                        error = None
+                    except DownloadError as e:
+                        size, sha256, error = None, None, e
+                        failed.append((url, file_path, e))
+                    if on_result is not None:
+                        on_result(url, file_path, size, sha256, error)
+
+            await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+            given_up += [(url, file_path, e) for url, file_path, e in failed if not e.retryable]
+            pending = [(url, file_path, e) for url, file_path, e in failed if e.retryable]
+            if not pending or round_nb == retry_rounds:
+                given_up += pending
+                break
+            print(f"{len(pending)} failed downloads, retry {round_nb + 1} out of {retry_rounds}.")
+            pending = [(url, file_path) for url, file_path, e in pending]
+            await asyncio.sleep(round_pause)
+
+    return [(url, file_path, str(e)) for url, file_path, e in given_up]
@@ -1,88 +1,78 @@
 # python '18_shares_owned/dl.py' '13G' '17_data_new/13G'
 # python '18_shares_owned/dl.py' '13D' '17_data_new/13D'
 import argparse
-import csv
-from pathlib import Path
-import time
-import requests
+import asyncio
+from download_engine import download_filings, sec_archives
+from download_ledger import DownloadLedger
+from filing_index import read_index
 
 
-def ensure_rate_limit(last_request_time, request_count, max_requests_per_second=10):
-    if request_count >= max_requests_per_second:
-        elapsed = time.time() - last_request_time
-        sleep_time = max(0, 1 - elapsed)
-        if sleep_time > 0:
-            time.sleep(sleep_time)
-        return time.time(), 0
-    return last_request_time, request_count + 1
+def filing_path(row, folder):
+    """
+    {folder}/{year}_{month}/{cik}_{date}_{accession}.txt, where accession is the last part
+    of the accession number.
+    """
+    cik = row["cik"].strip()
+    date = row["date"].strip()
+    year, month = date.split("-")[0:2]
+    accession = row["url"].strip().split(".")[0].split("-")[-1]
+    return f"{folder}/{year}_{month}/{cik}_{date}_{accession}.txt"
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("filing", type=str)
     parser.add_argument("folder", type=str)
-
-    user_agent = {"User-agent": "Mozilla/5.0"}
+    parser.add_argument("--index", type=str, default=r"17_data_new\full_index")
+    parser.add_argument("--ledger", type=str, default=r"17_data_new\download_ledger.sqlite")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--base-url", type=str, default=sec_archives)
 
     args = parser.parse_args()
     filing = args.filing
     folder = args.folder
 
-    to_dl = []
-    files_to_download = []
-    files_already_present = 0
-
-    with open(r"17_data_new\full_index.csv", "r") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if filing in row["form"]:
-                to_dl.append(row)
+    ledger = DownloadLedger(args.ledger)
 
-    print("start to download")
+    # Only the partitions of the forms containing `filing` are read, see filing_index.py.
+    index = read_index(args.index, forms=[filing], columns=["cik", "date", "url"])
+    index["cik"] = index["cik"].astype(str)
+    index["date"] = index["date"].dt.strftime("%Y-%m-%d")
 
-    # First Loop: Check for existing files and count them
-    for row in to_dl:
-        cik = row["cik"].strip()
-        date = row["date"].strip()
-        year = row["date"].split("-")[0].strip()
-        month = row["date"].split("-")[1].strip()
-        url = row["url"].strip()
-        accession = url.split(".")[0].split("-")[-1]
-        file_path = Path(f"{folder}/{year}_{month}/{cik}_{date}_{accession}.txt")
-
-        if not file_path.exists():
-            files_to_download.append(row)  # Add to download list if not exists
-        else:
-            files_already_present += 1  # Increment count for already present files
+    # First Step: Register the filings of the index in the ledger. Only the filings never seen
+    # before are checked on disk, the other ones already have a status.
+    added = ledger.register(
+        (row["url"].strip().rsplit("/", 1)[-1].split(".")[0], filing_path(row, folder), filing, row["url"].strip())
+        for row in index.to_dict("records")
+    )
+    ledger.reconcile(filing)
+    jobs = ledger.pending(filing)
 
     # Display counts
-    print(f"Total filings to process: {len(to_dl)}")
-    print(f"Files already present: {files_already_present}")
-    print(f"Files to download: {len(files_to_download)}")
-
-    # Second Loop: Download files, applying rate limit
-    last_request_time = time.time()
-    request_count = 0
-
-    for n, row in enumerate(files_to_download):
-        last_request_time, request_count = ensure_rate_limit(last_request_time, request_count)
-
-        print(f"Downloading {n + 1} out of {len(files_to_download)}")
-
-        cik = row["cik"].strip()
-        date = row["date"].strip()
-        year = row["date"].split("-")[0].strip()
-        month = row["date"].split("-")[1].strip()
-        url = row["url"].strip()
-        accession = url.split(".")[0].split("-")[-1]
-        Path(f"./{folder}/{year}_{month}").mkdir(parents=True, exist_ok=True)
-        file_path = f"./{folder}/{year}_{month}/{cik}_{date}_{accession}.txt"
-
-        try:
-            txt = requests.get(
-                f"https://www.sec.gov/Archives/{url}", headers=user_agent, timeout=60
-            ).text
-            with open(file_path, "w", errors="ignore") as f:
-                f.write(txt)
-        except:
-            print(f"{cik}, {date} failed to download")
\ No newline at end of file
+    print(f"Total filings to process: {len(index)}")
+    print(f"New filings in the index: {added}")
+    print(f"Files already present: {ledger.counts(filing).get('done', 0)}")
+    print(f"Files to download: {len(jobs)}")
+
+    # Second Step: Download files concurrently, see download_engine.py for the rate limit and retries
+    done = 0
+
+    def report(url, file_path, size, sha256, error):
+        global done
+        done += 1
+        if error is not None:
+            print(f"{url} failed to download: {error}")
+            ledger.mark_failed(file_path, error)
+        else:
+            ledger.mark_done(file_path, size, sha256)
+        if done % 100 == 0:
+            ledger.commit()
+            print(f"Downloaded {done} out of {len(jobs)}")
+
+    failed = asyncio.run(download_filings(jobs, args.base_url, concurrency=args.concurrency, on_result=report))
+    ledger.commit()
+
+    # Filings that still failed after all the retry rounds keep the status 'failed' in the ledger
+    # and are downloaded again on the next run.
+    print(f"{len(failed)} filings failed to download.")
+    ledger.close()
@@ -0,0 +1,132 @@
+import sqlite3
+from datetime import datetime
+from filing_store import filing_size
+
+
+class DownloadLedger:
+    """
+    The DownloadLedger object records the state of every 13D/G filing in a SQLite database,
+    so that knowing what is new, missing or failed doesn't require to stat one file per filing.
+
+    - register: adds the filings of the index that are not in the ledger yet, with the status 'new'.
+    - reconcile: marks as done the new filings already on disk (downloaded before the ledger existed).
+    - mark_done / mark_failed: record the outcome of a download, with the byte size and the
+      sha256 checksum of the file written, or the error.
+    - pending: the filings still to download (new or failed), after a crash a new run simply
+      resumes from there.
+    - downloaded / download_times: the file paths of the filings already downloaded (with the time
+      of their download), used by cusip_parser.py instead of walking the download folder.
+
+    The database is one row per filing keyed by accession number and file path, the same filing
+    being listed once per cik involved in the index.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS filings ("
+            "accession TEXT NOT NULL, file_path TEXT NOT NULL, form TEXT, url TEXT, "
+            "status TEXT NOT NULL, size INTEGER, sha256 TEXT, error TEXT, updated TEXT, "
+            "PRIMARY KEY (accession, file_path))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS filings_status ON filings (form, status)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS filings_path ON filings (file_path)")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def register(self, rows):
+        """
+        Argument 1: iterable of (accession, file_path, form, url).
+        Filings already in the ledger are left untouched. Returns the number of filings added.
+        """
+        before = self.connection.total_changes
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO filings (accession, file_path, form, url, status, updated) "
+            "VALUES (?, ?, ?, ?, 'new', ?)",
+            ((accession, file_path, form, url, now()) for accession, file_path, form, url in rows)
+        )
+        self.connection.commit()
+        return self.connection.total_changes - before
+
+    def reconcile(self, form=None):
+        """
+        Marks as done the filings with the status 'new' whose file is already on disk: the files
+        downloaded before the ledger existed, or written just before a crash. The files can be
+        loose or packed in a shard (see filing_store.py). Only these filings are checked, not the
+        whole download folder. Their byte size is recorded (not the checksum, which would require
+        to read every file). Returns the number of filings marked as done.
+        """
+        found = 0
+        for (file_path,) in self.connection.execute(
+                "SELECT file_path FROM filings WHERE status = 'new'" + (" AND form = ?" if form else ""),
+                (form,) if form else ()).fetchall():
+            try:
+                size = filing_size(file_path)
+            except FileNotFoundError:
+                continue
+            self.mark_done(file_path, size)
+            found += 1
+        self.connection.commit()
+        return found
+
+    def mark_done(self, file_path, size=None, sha256=None):
+        self.connection.execute(
+            "UPDATE filings SET status = 'done', size = ?, sha256 = ?, error = NULL, updated = ? "
+            "WHERE file_path = ?", (size, sha256, now(), file_path)
+        )
+
+    def mark_failed(self, file_path, error):
+        self.connection.execute(
+            "UPDATE filings SET status = 'failed', error = ?, updated = ? WHERE file_path = ?",
+            (str(error), now(), file_path)
+        )
+
+    def commit(self):
+        self.connection.commit()
+
+    def pending(self, form=None):
+        """
+        Returns the (url, file_path) of the filings still to download, i.e. new or failed.
+        """
+        return self.connection.execute(
+            "SELECT url, file_path FROM filings WHERE status != 'done'" + (" AND form = ?" if form else ""),
+            (form,) if form else ()
+        ).fetchall()
+
+    def downloaded(self, form=None):
+        """
+        Returns the file paths of the filings downloaded.
+        """
+        return [row[0] for row in self.connection.execute(
+            "SELECT file_path FROM filings WHERE status = 'done'" + (" AND form = ?" if form else ""),
+            (form,) if form else ()
+        )]
+
+    def download_times(self, form=None):
+        """
+        Returns {file path: time at which the filing was marked as done} for the filings downloaded. The
+        time stands for the modification time of the file (a filing downloaded again gets a new one),
+        without any stat.
+        """
+        rows = self.connection.execute(
+            "SELECT file_path, updated FROM filings WHERE status = 'done'" + (" AND form = ?" if form else ""),
+            (form,) if form else ()
+        )
+        return {file_path: datetime.fromisoformat(updated).timestamp() for file_path, updated in rows}
+
+    def counts(self, form=None):
+        """
+        Returns the number of filings per status.
+        """
+        return dict(self.connection.execute(
+            "SELECT status, COUNT(*) FROM filings" + (" WHERE form = ?" if form else "") + " GROUP BY status",
+            (form,) if form else ()
+        ).fetchall())
+
+
+def now():
+    return datetime.now().isoformat(timespec="seconds")
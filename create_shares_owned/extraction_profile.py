@@ -0,0 +1,114 @@
+# python '18_shares_owned/create_shares_owned/extraction_profile.py' '17_data_new/shares_owned.profile.csv' --top 20
+
+# Time spent by scrap.py on each filing, recorded with --profile.
+#
+# The workers time each FileSec.find_* call of a filing, and the reading of the filing (the bytes of the
+# cover page, its conversion to text when it is HTML, and its normalization), and return one record per
+# filing with its size, its file type and whether it is HTML. An extractor that has to search the whole
+# filing (see FileSec.search) includes the reading of the rest of the filing. The main process appends the
+# records to a csv, and prints at the end of the run the p50 / p95 / p99 of each step, the total time by
+# file type, HTML flag and size, and the slowest filings. Without --profile, nothing is timed.
+
+import argparse
+import csv
+import os
+import pandas as pd
+from filing_store import filing_size
+
+# Bounds of the size buckets, in bytes.
+size_buckets = [0, 16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, float('inf')]
+size_labels = ['<16KB', '16-64KB', '64-256KB', '256KB-1MB', '1-4MB', '>4MB']
+
+
+def profile_record(file, file_type, filing, timings):
+    """
+    This function returns the record of a filing.
+    Argument 1: file path.
+    Argument 2: file type (13D or 13G).
+    Argument 3: the FileSec of the filing, None if all its values came from the result cache.
+    Argument 4: {step: seconds}, the step 'read' and the find_* methods called.
+    """
+    try:
+        size = filing_size(file)
+    except (FileNotFoundError, OSError):
+        size = None
+    html = None
+    if filing is not None and filing.header is not None:
+        html = '<html>' in filing.header.lower()
+    record = {'file_path': file, 'file_type': file_type, 'size': size, 'html': html,
+              'total': sum(timings.values())}
+    record.update(timings)
+    return record
+
+
+class ProfileWriter:
+    """
+    The ProfileWriter object appends the records of the filings to a csv, one column of seconds per
+    step: 'read' and the find_* methods (see scrap.FIELDS). A method not called (value found in the
+    result cache) is empty.
+    """
+
+    def __init__(self, profile_path, steps):
+        self.profile_path = profile_path
+        self.columns = ['file_path', 'file_type', 'size', 'html', 'total', 'read'] + list(steps)
+        new = not os.path.exists(profile_path)
+        self.file = open(profile_path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, self.columns)
+        if new:
+            self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(record)
+
+    def close(self):
+        self.file.close()
+
+
+def report(profile_path, top=20):
+    """
+    This function prints the summary of a profile csv.
+    Argument 1: path of the csv written with scrap.py --profile.
+    Argument 2: number of slowest filings printed.
+    """
+    profile = pd.read_csv(profile_path)
+    if profile.empty:
+        print('No filing profiled.')
+        return
+    steps = list(profile.columns[profile.columns.get_loc('total'):])
+
+    # Milliseconds per filing, over the filings where the step was computed.
+    summary = pd.DataFrame({
+        'filings': profile[steps].count(),
+        'p50': profile[steps].quantile(0.5) * 1000,
+        'p95': profile[steps].quantile(0.95) * 1000,
+        'p99': profile[steps].quantile(0.99) * 1000,
+        'max': profile[steps].max() * 1000,
+    })
+    summary['total_s'] = profile[steps].sum()
+    summary['share'] = summary['total_s'] / profile['total'].sum()
+    print(f'{len(profile)} filings, {profile["total"].sum():.1f} seconds (milliseconds per filing):')
+    print(summary.round(3).to_string())
+
+    profile['size_bucket'] = pd.cut(profile['size'], size_buckets, labels=size_labels, right=False)
+    for group in ['file_type', 'html', 'size_bucket']:
+        by_group = profile.groupby(group, observed=True, dropna=False)['total']
+        print()
+        print(pd.DataFrame({
+            'filings': by_group.count(),
+            'p50_ms': by_group.median() * 1000,
+            'p99_ms': by_group.quantile(0.99) * 1000,
+            'total_s': by_group.sum(),
+        }).round(3).to_string())
+
+    print()
+    print(f'{top} slowest filings (seconds):')
+    slowest = profile.nlargest(top, 'total')
+    print(slowest[['file_path', 'file_type', 'size', 'html', 'total', 'read']].round(3).to_string(index=False))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('profile', help='csv written by scrap.py --profile')
+    parser.add_argument('--top', type=int, default=20, help='number of slowest filings printed')
+    args = parser.parse_args()
+    report(args.profile, args.top)
@@ -0,0 +1,185 @@
+# python '18_shares_owned/create_shares_owned/filing_index.py' '17_data_new/full_index.csv' '17_data_new/full_index'
+
+# Columnar version of full_index.csv. The filing index is stored as Parquet files partitioned by
+# normalized form type and year, e.g. full_index/form_type=SC_13D/year=2004/<part>.parquet.
+# read_index only opens the partitions matching the requested forms and years, so selecting the
+# 13D/G filings doesn't require to scan the millions of rows of the other forms.
+
+import argparse
+import os
+import re
+import uuid
+from pathlib import Path
+import pandas as pd
+
+index_columns = ["cik", "comnam", "form", "date", "url", "accession"]
+
+
+def normalize_form(form):
+    """
+    SC 13D/A -> SC_13D_A
+    The normalized form is used as partition value, it only contains characters allowed in a
+    directory name.
+    """
+    return re.sub(r"[^0-9A-Z]+", "_", str(form).strip().upper()).strip("_")
+
+
+def accession_key(url):
+    """
+    Vectorized: edgar/data/1000045/0000950123-94-000001.txt -> 950123940000001
+    The 18 digits of the accession number fit in an int64, which is far more compact than the
+    string when used as a deduplication key.
+    """
+    digits = url.str.extract(r"(\d{10})-(\d{2})-(\d{6})\.txt", expand=True)
+    return pd.to_numeric(digits[0] + digits[1] + digits[2], errors="coerce").astype("Int64")
+
+
+def to_frame(rows):
+    """
+    Converts rows [cik, comnam, form, date, url] (as found in master.idx) or a DataFrame with
+    these columns into the typed frame stored in the index.
+    """
+    if isinstance(rows, pd.DataFrame):
+        df = rows[["cik", "comnam", "form", "date", "url"]].copy()
+    else:
+        df = pd.DataFrame(rows, columns=["cik", "comnam", "form", "date", "url"])
+    for column in ["comnam", "form", "url"]:
+        df[column] = df[column].astype(str).str.strip()
+    df["cik"] = pd.to_numeric(df["cik"], errors="coerce").astype("Int64")
+    df["date"] = pd.to_datetime(df["date"].astype(str).str.strip(), format="%Y-%m-%d", errors="coerce")
+    df["accession"] = accession_key(df["url"])
+    return df.dropna(subset=["cik", "date"])
+
+
+def write_frame(df, root):
+    """
+    This function appends a frame returned by to_frame to the index stored in root.
+    Every call adds one new part file to each partition it touches, existing parts are not rewritten.
+    A part is written under a temporary name and then renamed, so that a reader listing the
+    partition never opens a part being written.
+    """
+    if df.empty:
+        return 0
+    df = df.assign(form_type=df["form"].map(normalize_form), year=df["date"].dt.year)
+    for (form_type, year), part in df.groupby(["form_type", "year"]):
+        part_dir = Path(root) / f"form_type={form_type}" / f"year={year}"
+        part_dir.mkdir(parents=True, exist_ok=True)
+        part_path = part_dir / f"{uuid.uuid4().hex}.parquet"
+        part.drop(columns=["form_type", "year"]).to_parquet(f"{part_path}.tmp", index=False)
+        os.replace(f"{part_path}.tmp", part_path)
+    return len(df)
+
+
+def append_rows(rows, root):
+    """
+    This function appends filings to the index stored in root.
+    Argument 1: rows [cik, comnam, form, date, url] or a DataFrame with these columns.
+    Argument 2: directory of the index.
+    """
+    return write_frame(to_frame(rows), root)
+
+
+def compact_partitions(root, years=None, min_files=8):
+    """
+    Each append adds part files, so a partition updated every night ends up with many small
+    files. This function rewrites the partitions of the given years holding at least min_files
+    parts into a single file. The new file is renamed to its final name before the old parts are
+    removed: a crash in between leaves duplicated rows in the partition, never lost ones.
+    """
+    for year_dir in sorted(Path(root).glob("form_type=*/year=*")):
+        if years is not None and int(year_dir.name.split("=", 1)[1]) not in years:
+            continue
+        parts = sorted(year_dir.glob("*.parquet"))
+        if len(parts) < min_files:
+            continue
+        df = pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True)
+        tmp_path = year_dir / "compacted.parquet.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, year_dir / f"{uuid.uuid4().hex}.parquet")
+        for part in parts:
+            part.unlink()
+
+
+def partition_files(root, forms=None, start=None, end=None):
+    """
+    Lists the parquet files of the partitions matching the forms and the years of [start, end].
+    A form matches a partition when its normalized value is contained in the partition form type,
+    as in the former `filing in row["form"]` test: '13D' selects SC_13D and SC_13D_A.
+    """
+    wanted = None if forms is None else [normalize_form(form) for form in forms]
+    first_year = None if start is None else pd.Timestamp(start).year
+    last_year = None if end is None else pd.Timestamp(end).year
+
+    files = []
+    for form_dir in sorted(Path(root).glob("form_type=*")):
+        form_type = form_dir.name.split("=", 1)[1]
+        if wanted is not None and not any(form in form_type for form in wanted):
+            continue
+        for year_dir in sorted(form_dir.glob("year=*")):
+            year = int(year_dir.name.split("=", 1)[1])
+            if first_year is not None and year < first_year:
+                continue
+            if last_year is not None and year > last_year:
+                continue
+            files.extend(sorted(year_dir.glob("*.parquet")))
+    return files
+
+
+def read_index(root, forms=None, start=None, end=None, ciks=None, columns=None):
+    """
+    This function returns the filings of the index for the given forms, date range and ciks.
+    Argument 1: directory of the index.
+    Argument 2: list of form types, e.g. ['13D']. None selects every form.
+    Argument 3 and 4: first and last filing dates (inclusive). None leaves the range open.
+    Argument 5: iterable of ciks. None selects every cik.
+    Argument 6: columns to load, the date and cik columns are added when needed for filtering.
+    Only the partitions that can contain matching rows are read, and the date range is applied
+    while reading them, so the rows of the other months of these years are never loaded.
+    """
+    load = None
+    if columns is not None:
+        load = list(columns)
+        for column, needed in [("date", start is not None or end is not None), ("cik", ciks is not None)]:
+            if needed and column not in load:
+                load.append(column)
+
+    files = partition_files(root, forms, start, end)
+    if not files:
+        empty = to_frame([])
+        return empty if columns is None else empty[list(columns)]
+    filters = []
+    if start is not None:
+        filters.append(("date", ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append(("date", "<=", pd.Timestamp(end)))
+    df = pd.concat([pd.read_parquet(f, columns=load, filters=filters or None) for f in files], ignore_index=True)
+
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= df["date"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= df["date"] <= pd.Timestamp(end)
+    if ciks is not None:
+        mask &= df["cik"].isin([int(cik) for cik in ciks])
+    df = df[mask].reset_index(drop=True)
+    return df if columns is None else df[list(columns)]
+
+
+def build_from_csv(csv_file, root, chunksize=1_000_000):
+    """
+    One-off conversion of an existing full_index.csv into the partitioned index.
+    """
+    total = 0
+    for chunk in pd.read_csv(csv_file, dtype=str, encoding="latin1", chunksize=chunksize):
+        total += append_rows(chunk, root)
+        print(f"{total} filings written.")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("csv")
+    parser.add_argument("root")
+    args = parser.parse_args()
+
+    build_from_csv(args.csv, args.root)
@@ -1,9 +1,13 @@
 import re
 from datetime import datetime
-from bs4 import BeautifulSoup, NavigableString
+from functools import cached_property
+from filing_store import decode_filing, open_filing, read_filing_bytes
+from html_text import html_to_text
+from sec_header import header_record, read_sec_header
+from text_cache import cache_key, default_cache
 
 
-def find_nb_shares(content, str_match, str_not_match, next_lines):
+def find_nb_shares(content, str_match, str_not_match, next_lines, normalized_lines=None, lower_lines=None):
     """
        Parses and retrieves the number of shares located near a specified string (`str_match`) but before
        another string (`str_not_match`), considering different formatting conventions:
@@ -29,6 +33,9 @@ def find_nb_shares(content, str_match, str_not_match, next_lines):
                                 sections of the content.
            next_lines (int): The number of lines to consider after a `str_match` keyword has been found. This
                              allows the function to search within a specific range rather than the entire document.
+           normalized_lines, lower_lines (list of str, optional): The lines with whitespace collapsed and
+                             lowercased, and the lines lowercased. FileSec passes its cached views, otherwise
+                             they are computed here.
 
        Returns:
            str: The number of shares found matching the specified criteria. Returns the number as a string,
@@ -48,13 +55,16 @@ def find_nb_shares(content, str_match, str_not_match, next_lines):
         re.compile(r'None')
     ]
 
-    lines = content.splitlines()
-    for i, line in enumerate(lines):
-        normalized_line = re.sub(r'\s+', ' ', line).lower()
+    lines = content.splitlines() if isinstance(content, str) else content
+    if normalized_lines is None:
+        normalized_lines = normalize_lines(lines)
+    if lower_lines is None:
+        lower_lines = [line.lower() for line in lines]
+    for i, normalized_line in enumerate(normalized_lines):
         if any(match in normalized_line for match in str_match):
             for j in range(0, next_lines):
                 if i + j < len(lines):
-                    if str_not_match in lines[i + j].lower():
+                    if str_not_match in lower_lines[i + j]:
                         return 'None'
                     add1 = re.findall(pattern1, lines[i + j])
                     add2 = re.findall(pattern2, lines[i + j])
@@ -71,7 +81,7 @@ def find_nb_shares(content, str_match, str_not_match, next_lines):
     return 'None'
 
 
-def find_percentage(content, str_match, str_not_match, next_lines):
+def find_percentage(content, str_match, str_not_match, next_lines, normalized_lines=None, lower_lines=None):
     """
     Finds and returns a percentage value located near specified keywords (`str_match`) but before
     another keyword (`str_not_match`) in the provided content. This function considers various
@@ -97,6 +107,7 @@ def find_percentage(content, str_match, str_not_match, next_lines):
         str_match (list): Keywords indicating the start of the search section.
         str_not_match (str): A keyword that, if encountered, stops the search in the current range.
         next_lines (int): Number of lines to check following each `str_match` occurrence.
+        normalized_lines, lower_lines (list, optional): Cached views of the lines, see find_nb_shares.
 
     Returns:
         str: The detected percentage matching criteria, 'None' for 'see attachment' and undetected %.
@@ -108,14 +119,17 @@ def find_percentage(content, str_match, str_not_match, next_lines):
     pattern2 = re.compile(r'(?<=\s)(100(?:\.0{1,2})?|0(?:\.\d{1,2})?|[1-9]?\d(?:\.\d{1,2})?)')
     pattern3 = re.compile(r'-?\d+(?:\.\d+)?(?=[*])')
     pattern4 = re.compile(r'\b\d+\.\d+\b')
-    lines = content.splitlines()
+    lines = content.splitlines() if isinstance(content, str) else content
+    if normalized_lines is None:
+        normalized_lines = normalize_lines(lines)
+    if lower_lines is None:
+        lower_lines = [line.lower() for line in lines]
     matches = []
-    for i, line in enumerate(lines):
-        normalized_line = re.sub(r'\s+', ' ', line).lower()
+    for i, normalized_line in enumerate(normalized_lines):
         if any(match in normalized_line for match in str_match):
             for j in range(0, next_lines):
                 if i + j < len(lines):
-                    if str_not_match in lines[i +j].lower():
+                    if str_not_match in lower_lines[i + j]:
                         return 'None'
                     add_1 = re.findall(pattern1, lines[i + j])
                     add_3 = re.findall(pattern3, lines[i +j])
@@ -129,7 +143,7 @@ def find_percentage(content, str_match, str_not_match, next_lines):
                     if add_4:
                         shares_add = re.sub(r'[<> a-z%]', '', add_4[0])
                         return shares_add
-                    if 'see attachment' in lines[i + j].lower():
+                    if 'see attachment' in lower_lines[i + j]:
                         return 'None'
                     add_2 = re.findall(pattern2, lines[i + j])
                     matches.extend(add_2)
@@ -139,110 +153,410 @@ def find_percentage(content, str_match, str_not_match, next_lines):
     return 'None'
 
 
-def modify_text(element, limit=1000):
+# Version of the text given to the extractors (decode_filing, html_to_text, normalize_lines and the cover
+# page window), part of the key of the text cache. To be increased when one of them changes.
+normalizer_version = 1
+
+
+def normalize_lines(lines):
     """
-        In some filings in html format, the text enclosed by a tag includes a newline character within the
-        string I aim to match. This function recursively normalizes the whitespace in the text of a given element
-        and its descendants within a hierarchical structure (such as HTML or XML) up to a specified limit of text
-        modifications. It aims to ensure that there is exactly one space between words in the text, and no leading
-        or trailing spaces, enhancing text consistency and readability.
-
-        Parameters:
-        - element: The root element from which to start modifying text. It is assumed that this element and its
-          descendants can have text (NavigableString objects) and/or child elements.
-        - limit (optional): The maximum number of text modifications to perform. Defaults to 1000. Some filings are
-        really long, only the first NavigableString objects are necessary. Moreover, some very long filings also
-        have some deeply nested structure at the end which triggers python's recursion limit. To limit the number
-        of modifications at 1000 seems to avoid the issue.
-
-        The function employs a nested helper function, _modify, which traverses the structure recursively,
-        performing whitespace normalization on each text node encountered. The traversal and modifications
-        halt when the limit is reached. A counter dictionary is used to track the number of modifications
-        across the recursive calls.
-        """
-    counter = {'count': 0}
-
-    def _modify(element):
-
-        if counter['count'] >= limit:
-            return
-        if not element.contents:
-            return
-        for content in element.contents:
-            if isinstance(content, NavigableString):
-                new_text = ' '.join(content.strip().split())
-                content.replace_with(new_text)
-                counter['count'] += 1
+    Collapses the whitespace of each line and lowercases it, the form in which the keywords are searched.
+    """
+    return [re.sub(r'\s+', ' ', line).lower() for line in lines]
+
+
+# Rows of the cover page (Items 7 to 13): keywords starting the search and string stopping it.
+cover_page_fields = {
+    'shares_sole_vote': (['sole voting', 'item 7'], 'shared voting power'),
+    'shares_shared_vote': (['shared voting', 'item 8'], 'sole dispositive power'),
+    'shares_sole_dispositive': (['sole dispositive', 'sole disposition', 'item 9'], 'shared dispositive power'),
+    'shares_shared_dispositive': (['shared dispositive', 'shared disposition', 'item 10'],
+                                  'aggregate amount beneficially'),
+    'shares_agg': (['aggregate amount', 'amount beneficially owned', 'item 11'], 'Check if the Aggregate Amount'),
+    'shares_percentage': (['percent of class', 'class represented by', 'item 13'], 'type of reporting'),
+}
+cover_page_keywords = re.compile('|'.join(re.escape(keyword) for str_match, str_not_match in cover_page_fields.values()
+                                          for keyword in str_match))
+shares_pattern1 = re.compile(r'\b\d{1,3}(?:,\d{3})+\b')
+shares_pattern2 = re.compile(r'\d{3}')
+shares_patterns_0 = [re.compile(r'\b0\b'), re.compile(r' 0 '), re.compile(r'-0-'), re.compile(r'None')]
+percentage_pattern1 = re.compile(r'-?\d{1,3}(?:,\d{3})*(?:\.\d+)?%')
+percentage_pattern2 = re.compile(r'(?<=\s)(100(?:\.0{1,2})?|0(?:\.\d{1,2})?|[1-9]?\d(?:\.\d{1,2})?)')
+percentage_pattern3 = re.compile(r'-?\d+(?:\.\d+)?(?=[*])')
+percentage_pattern4 = re.compile(r'\b\d+\.\d+\b')
+
+
+def shares_in_line(line):
+    """
+    The number of shares read on a line by find_nb_shares, None if the line holds none.
+    """
+    for pattern in (shares_pattern1, shares_pattern2):
+        match = pattern.search(line)
+        if match:
+            return re.sub(r'[<> a-z]', '', match.group())
+    if any(pattern_0.search(line) for pattern_0 in shares_patterns_0):
+        return '0'
+    return None
+
+
+def percentage_in_line(line):
+    """
+    The percentage read on a line by find_percentage, None if the line holds none.
+    """
+    for pattern in (percentage_pattern1, percentage_pattern3, percentage_pattern4):
+        match = pattern.search(line)
+        if match:
+            return re.sub(r'[<> a-z%]', '', match.group())
+    return None
+
+
+def find_cover_page(content, next_lines=20, normalized_lines=None, lower_lines=None):
+    """
+    Returns the five numbers of shares and the percentage of the cover page in one pass over the lines,
+    as a dict keyed by the names of cover_page_fields. The values are the same as those of find_nb_shares
+    and find_percentage called with the arguments of cover_page_fields.
+
+    Both functions return the first decision met in the `next_lines` lines following a keyword, and the
+    decision only depends on the line it is read on (stop string, number, zero). So the value of a row is
+    the decision of the first line lying less than `next_lines` lines after one of its keywords. The lines
+    are walked once, each row remembering its last keyword line, and the number of shares of a line is only
+    searched once for all the rows. For the percentage, the numbers without '%' collected in a window are
+    used when the window ends, as in find_percentage.
+
+    Args:
+        content (str or list of str): The text of the filing or its lines.
+        next_lines (int): The number of lines searched after a keyword.
+        normalized_lines, lower_lines (list of str, optional): Cached views of the lines, see find_nb_shares.
+
+    Returns:
+        dict: The value of each row, 'None' when not found, None for every row if content is None.
+    """
+    if content is None:
+        return dict.fromkeys(cover_page_fields)
+
+    lines = content.splitlines() if isinstance(content, str) else content
+    if normalized_lines is None:
+        normalized_lines = normalize_lines(lines)
+    if lower_lines is None:
+        lower_lines = [line.lower() for line in lines]
+
+    results = {}
+    last_keyword = {}
+    window_ends = []
+    percentages = []
+    for i, normalized_line in enumerate(normalized_lines):
+        if cover_page_keywords.search(normalized_line):
+            for field, (str_match, str_not_match) in cover_page_fields.items():
+                if field not in results and any(match in normalized_line for match in str_match):
+                    last_keyword[field] = i
+                    if field == 'shares_percentage':
+                        window_ends.append(i + next_lines - 1)
+
+        shares = False
+        for field, keyword_line in last_keyword.items():
+            if field in results or i - keyword_line >= next_lines:
+                continue
+            if cover_page_fields[field][1] in lower_lines[i]:
+                results[field] = 'None'
+            elif field == 'shares_percentage':
+                percentage = percentage_in_line(lines[i])
+                if percentage is not None:
+                    results[field] = percentage
+                elif 'see attachment' in lower_lines[i]:
+                    results[field] = 'None'
+                else:
+                    percentages.extend(percentage_pattern2.findall(lines[i]))
             else:
-                _modify(content)
+                if shares is False:
+                    shares = shares_in_line(lines[i])
+                if shares is not None:
+                    results[field] = shares
+
+        while window_ends and window_ends[0] <= i:
+            window_ends.pop(0)
+            if percentages and 'shares_percentage' not in results:
+                results['shares_percentage'] = re.sub(r'[<> a-z]', '', percentages[-1])
+        if len(results) == len(cover_page_fields):
+            break
+
+    if window_ends and percentages and 'shares_percentage' not in results:
+        results['shares_percentage'] = re.sub(r'[<> a-z]', '', percentages[-1])
+    return {field: results.get(field, 'None') for field in cover_page_fields}
 
-            if counter['count'] >= limit:
-                break
-    _modify(element)
+
+# Heading of Item 2, 'Identity and Background' in a 13D and 'Name of Person Filing' in a 13G. The cover
+# page and Item 1 are over once it is reached. The title can be in the next line (e.g. another table cell).
+item_2_heading = re.compile(r'^\W*item 2\W*(?:a\W*)?(?:identity|name of (?:the )?person)')
+
+
+def cover_page_end(normalized_lines):
+    """
+    Returns the index of the Item 2 heading in the normalized lines, their number if there is none.
+    """
+    for i, line in enumerate(normalized_lines):
+        if 'item 2' in line:
+            next_line = normalized_lines[i + 1] if i + 1 < len(normalized_lines) else ''
+            if item_2_heading.match(line + ' ' + next_line):
+                return i
+    return len(normalized_lines)
+
+
+def find_transaction_date(lines, lower_lines):
+    """
+    Returns the date found in the 10 lines around 'date of event' or 'effective date', 'None' if there is none.
+    """
+    # Updated pattern to match both written and numeric date formats, including 2-digit year
+    date_pattern = (
+        r'(January|February|March|April|May|June|'
+        r'July|August|September|October|November|December)\s+\d{1,2}(?:\s*and\s*\d{1,2})?\s*,\s*\d{4}|'
+        r'\d{1,2}/\d{1,2}/\d{2,4}'  # Keeps matching years with 2 or 4 digits
+    )
+    for i in range(len(lines)):
+        str_match = ['date of event', 'effective date']
+        if any(match in lower_lines[i] for match in str_match):
+            # Concatenate the lines from 5 before to 5 after the current index for broader context
+            concatenated = ' '.join(lines[max(0, i - 10):min(len(lines), i + 10)])
+            # Replace non-breaking spaces with standard spaces
+            concatenated = concatenated.replace('\xa0', ' ')
+            match = re.search(date_pattern, concatenated, re.IGNORECASE)
+            if match:
+                date_add_transaction = match.group()
+                return date_add_transaction
+    return 'None'
+
+
+# Patterns with \s+ to match one or more whitespace characters
+cusip_patterns = [
+    re.compile(r'\b[0-9A-Z]{1}[0-9]{3}[0-9A-Za-z]{2}[-\s]*[0-9]{0,2}[-\s]*[0-9]{0,1}\b'),
+    re.compile(r'\b[0-9]{5}\s+[A-Z]\s+[0-9]{2}\s+[0-9]{1}\b'),
+    re.compile(r'\b[0-9]{3}\s+[0-9]{3}\s+[0-9]{2}\s+[0-9]{1}\b'),
+    re.compile(r'\b[0-9]{3}\s+[0-9]{3}\s+[0-9]{3}\b'),
+    re.compile(r'\b[0-9]{9}\b'),
+    re.compile(r'\b[0-9]{4}[A-Z]{1}\s+[0-9]{2}\s+[0-9]{1}\b'),
+    re.compile(r'\b[0-9]{5}[A-Z][0-9]{3}\b'),
+    re.compile(r'\b[0-9]{5}\s+[0-9]{2}\s+[0-9]{1}\b'),
+    re.compile(r'\b[0-9A-Z]{6}\s{2}[0-9]{3}\b'),
+    re.compile(r'\b\d{4} \d{5}\b')
+]
+
+
+def find_cusip(lines):
+    """
+    Returns the first CUSIP found in the 10 lines around a line mentioning 'cusip', 'No CUSIP' if there is none.
+    """
+    for i, line in enumerate(lines):
+        if 'cusip' in line.casefold():
+            for j in range(max(0, i-10), min(len(lines), i+10)):
+                for pattern in cusip_patterns:
+                    match = pattern.search(lines[j])
+                    if match:
+                        # Remove spaces and dashes, then strip any surrounding angle brackets or other characters
+                        cusip_add = re.sub(r'[\s-]+', '', match.group())
+                        return cusip_add
+    return 'No CUSIP'
+
+
+def extractor(version):
+    """
+    Tags a find_* method of FileSec with the version of its rules, used by scrap.py to reuse the values
+    computed by a former run (see result_cache.py). The version is to be increased whenever a change can
+    modify the value returned by the method.
+    """
+    def tag(method):
+        method.version = version
+        return method
+    return tag
+
+
+def to_shares(value):
+    """
+    '1,234,567' -> 1234567. The values which are not a number of shares ('None') give None.
+    """
+    try:
+        shares = int(value.replace(',', ''))
+    except (AttributeError, ValueError):
+        return None
+    # A sequence of digits too long to be a number of shares doesn't fit in an int64.
+    return shares if shares < 2 ** 63 else None
+
+
+def to_percentage(value):
+    """
+    '12.1' -> 12.1. The values which are not a percentage ('None') give None.
+    """
+    try:
+        return float(value.replace(',', ''))
+    except (AttributeError, ValueError):
+        return None
+
+
+def to_cik(value):
+    """
+    '0000300000' -> 300000
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TextLines:
+    """
+    A text split into lines. The lowercased lines and the normalized lines (see normalize_lines) are
+    computed on first use and shared by all the extractors.
+    """
+
+    def __init__(self, lines, normalized_lines=None):
+        self.lines = lines
+        if normalized_lines is not None:
+            self.normalized_lines = normalized_lines
+
+    @cached_property
+    def lower_lines(self):
+        return [line.lower() for line in self.lines]
+
+    @cached_property
+    def normalized_lines(self):
+        return normalize_lines(self.lines)
 
 
 class FileSec:
     """
     The Filesec object is designed for parsing 13D/G filings, initialized with
-    a specific file_path.
-
-    - read_file_header: This method extracts key information from the highly
-      structured headers of 13D/G filings, including the filing's issue date,
-      company's name, owner's name, and both the company's and owner's CIKs.
-      It reads the entire file to store header information in the header
-      attribute, focusing solely on the file's header for information extraction,
-      despite reading the full file. Another method, read_file_content, also reads
-      the file but modifies it in ways that could complicate header parsing.
-
-    - read_file_content: This method handles the parsing of 13D/G filings, which
-      can be in text or HTML formats, by converting HTML formats into text format
-      for uniform processing. It first uses the modify_text function to ensure
-      that text within tags is newline-free. Then, it employs BeautifulSoup's
-      get_text() method to extract text within tags. In cases where the text
-      forms a large block, a newline is introduced for each tag listed in
-      block_level_tags. This process populates the content attribute, which is
-      subsequently used to extract important details such as the event date,
-      number of shares, and the aggregate proportion of shares.
+    a specific file_path. Only the beginning of the file is read at first, the
+    answers being on the cover page.
+
+    - header: The decoded text of the first cover_bytes bytes of the filing.
+
+    - sec_header: The record of the highly structured SEC header (see
+      sec_header.py), which gives the filing's issue date, company's name,
+      owner's name, and both the company's and owner's CIKs.
+
+    - cover: The lines of the cover page, from the first <DOCUMENT> to the
+      heading of Item 2 (or the end of the cover_bytes bytes). The event date,
+      cusip, numbers of shares and aggregate proportion of shares are searched
+      there first.
+
+    - content / full: The text of the whole filing and its lines, read on first
+      use only, when a value is missing on the cover page. 13D/G filings can be
+      in text or HTML formats. HTML filings are converted into text format for
+      uniform processing by html_to_text, one line per block, up to
+      html_max_chars characters. Text filings are used as they are.
+
+    The find_* methods return typed values: the numbers of shares and the ciks
+    as int, the percentage as float, and None when a value isn't found.
+
+    The parsing time and the memory used depend on the size of the cover page,
+    not of the filing (exhibits, agreements, encoded PDFs, ...), unless a value
+    has to be searched in the whole filing.
+
+    When a text cache is configured (see text_cache.py), the lines of the cover
+    page and of the whole filing are read from it instead of being computed.
     """
 
-    def __init__(self, file_path):
+    def __init__(self, file_path, cover_bytes=262_144, html_max_chars=1_000_000):
         self.file_path = file_path
-        self.content = self.read_file_content()
-        self.header = self.read_file_header()
+        self.cover_bytes = cover_bytes
+        self.html_max_chars = html_max_chars
+        self.complete = False
+        self.data = None
+        self.header = self.read_file()
 
-    def read_file_header(self):
+    def read_file(self):
+        """
+        Reads the first cover_bytes bytes of the filing. complete records whether it is the whole filing.
+        """
         try:
-            with open(self.file_path, 'r') as file:
-                content = file.read()
-                return content
+            with open_filing(self.file_path, 'rb') as f:
+                self.data = f.read(self.cover_bytes)
+                self.complete = len(self.data) < self.cover_bytes or not f.read(1)
         except FileNotFoundError:
             print('File not found.')
             return None
         except IOError as e:
             print(f'Failed to open or read the file: {e}')
             return None
+        return decode_filing(self.data)
 
-    def read_file_content(self):
-        try:
-            with open(self.file_path, 'r') as file:
-                content = file.read()
-
-                # Check if '<html>' is in the content (simple check for HTML presence)
-                if '<html>' in content.lower():
-                    # Parse the HTML content and extract text
-                    soup = BeautifulSoup(content, 'lxml')
-                    modify_text(soup)
-                    text_only = soup.get_text(separator='\n')
-                    return text_only
-                else:
-                    return content
+    @cached_property
+    def raw(self):
+        return self.data if self.complete else read_filing_bytes(self.file_path)
 
-        except FileNotFoundError:
-            print('File not found.')
+    @cached_property
+    def content(self):
+        if self.header is None:
             return None
-        except IOError as e:
-            print(f'Failed to open or read the file: {e}')
+        text = self.header if self.complete else decode_filing(self.raw)
+
+        # Check if '<html>' is in the content (simple check for HTML presence)
+        if '<html>' in text.lower():
+            return html_to_text(text, self.html_max_chars)
+        else:
+            return text
+
+    @cached_property
+    def sec_header(self):
+        if self.header is None:
             return None
+        record = header_record(self.data)
+        if record['end'] is None and not self.complete:
+            # The header is longer than the bytes read.
+            record = read_sec_header(self.file_path)
+        return record
+
+    def cached_lines(self, kind, data, compute):
+        """
+        Returns compute(), the TextLines computed from the bytes data, through the text cache when one
+        is configured (see text_cache.py).
+        """
+        cache = default_cache()
+        if cache is None:
+            return compute()
+        key = cache_key(data, kind, normalizer_version, self.cover_bytes, self.html_max_chars)
+        cached = cache.get(key)
+        if cached is not None:
+            return TextLines(*cached)
+        text = compute()
+        cache.put(key, text.lines, text.normalized_lines)
+        return text
+
+    @cached_property
+    def cover(self):
+        return self.cached_lines('cover', self.data, self.read_cover)
+
+    def read_cover(self):
+        text = self.header
+        start = text.upper().find('<DOCUMENT>')
+        text = text[max(start, 0):]
+        if '<html>' in text.lower():
+            text = html_to_text(text, self.html_max_chars)
+        lines = text.splitlines()
+        normalized_lines = normalize_lines(lines)
+        end = cover_page_end(normalized_lines)
+        return TextLines(lines[:end], normalized_lines[:end])
+
+    @cached_property
+    def full(self):
+        return self.cached_lines('full', self.raw, lambda: TextLines(self.content.splitlines()))
+
+    def search(self, find, missing):
+        """
+        Returns find(lines) on the cover page, or on the whole filing if the value is missing on the cover page.
+        """
+        value = find(self.cover)
+        if value == missing:
+            value = find(self.full)
+        return value
+
+    @cached_property
+    def cover_page(self):
+        if self.header is None:
+            return find_cover_page(None)
+        values = find_cover_page(self.cover.lines, 20, self.cover.normalized_lines, self.cover.lower_lines)
+        if 'None' in values.values():
+            full_values = find_cover_page(self.full.lines, 20, self.full.normalized_lines, self.full.lower_lines)
+            values = {field: full_values[field] if value == 'None' else value for field, value in values.items()}
+        return values
 
     def find_file_type(self):
         if '13D' in self.file_path:
@@ -250,155 +564,83 @@ class FileSec:
         else:
             return '13G'
 
+    @extractor(1)
     def find_issue_date(self):
-        if self.content is None:
+        if self.header is None or self.sec_header['filed_date'] is None:
             return None
 
-        lines = self.header.splitlines()
-        for line in lines:
-            if 'FILED AS OF DATE' in line:
-                date_str = re.sub('[^0-9]', '', line)
-                date_add_issue = datetime.strptime(date_str, '%Y%m%d').strftime('%m-%d-%Y')
-                return date_add_issue
+        date_str = re.sub('[^0-9]', '', self.sec_header['filed_date'])
+        date_add_issue = datetime.strptime(date_str, '%Y%m%d').strftime('%m-%d-%Y')
+        return date_add_issue
 
+    @extractor(2)
     def find_transaction_date(self):
-        if self.content is None:
-            return 'None'
-
-        # Updated pattern to match both written and numeric date formats, including 2-digit year
-        date_pattern = (
-            r'(January|February|March|April|May|June|'
-            r'July|August|September|October|November|December)\s+\d{1,2}(?:\s*and\s*\d{1,2})?\s*,\s*\d{4}|'
-            r'\d{1,2}/\d{1,2}/\d{2,4}'  # Keeps matching years with 2 or 4 digits
-        )
-        lines = self.content.splitlines()
-        for i in range(len(lines)):
-            str_match = ['date of event', 'effective date']
-            if any(match in lines[i].lower() for match in str_match):
-                # Concatenate the lines from 5 before to 5 after the current index for broader context
-                concatenated = ' '.join(lines[max(0, i - 10):min(len(lines), i + 10)])
-                # Replace non-breaking spaces with standard spaces
-                concatenated = concatenated.replace('\xa0', ' ')
-                match = re.search(date_pattern, concatenated, re.IGNORECASE)
-                if match:
-                    date_add_transaction = match.group()
-                    return date_add_transaction
-        return 'None'
-
-    def find_company_name(self):
         if self.header is None:
             return None
-        yes = 0
-        lines = self.header.splitlines()
-        for line in lines:
-            if 'SUBJECT COMPANY' in line:
-                yes = 1
-            if 'COMPANY CONFORMED NAME' in line and yes == 1:
-                company_add = line.split('\t\t\t')[-1].strip()
-                return company_add
+        date = self.search(lambda text: find_transaction_date(text.lines, text.lower_lines), 'None')
+        return None if date == 'None' else date
 
-    def find_company_cik(self):
+    def company(self, role):
+        """
+        The SUBJECT COMPANY entity of the header for role 'subject_company', the first FILED BY entity
+        for role 'filed_by'. None if the header has none.
+        """
         if self.header is None:
             return None
-        yes = 0
-        lines = self.header.splitlines()
-        for line in lines:
-            if 'SUBJECT COMPANY' in line:
-                yes = 1
-            if 'CENTRAL INDEX KEY' in line and yes == 1:
-                cik_add = line.split('\t\t\t')[-1].strip()
-                return cik_add
+        if role == 'filed_by':
+            return self.sec_header['filed_by'][0] if self.sec_header['filed_by'] else None
+        return self.sec_header['subject_company']
+
+    @extractor(1)
+    def find_company_name(self):
+        company = self.company('subject_company')
+        return company['name'] if company else None
 
+    @extractor(2)
+    def find_company_cik(self):
+        company = self.company('subject_company')
+        return to_cik(company['cik']) if company else None
+
+    @extractor(1)
     def find_owner_name(self):
-        if self.header is None:
-            return None
-        yes = 0
-        lines = self.header.splitlines()
-        for line in lines:
-            if 'FILED BY' in line:
-                yes = 1
-            if 'COMPANY CONFORMED NAME' in line and yes == 1:
-                owner_add = line.split('\t\t\t')[-1].strip()
-                return owner_add
+        owner = self.company('filed_by')
+        return owner['name'] if owner else None
 
+    @extractor(2)
     def find_owner_cik(self):
-        if self.header is None:
-            return None
-        yes = 0
-        lines = self.header.splitlines()
-        for line in lines:
-            if 'FILED BY' in line:
-                yes = 1
-            if 'CENTRAL INDEX KEY' in line and yes == 1:
-                cik_add = line.split('\t\t\t')[-1].strip()
-                return cik_add
+        owner = self.company('filed_by')
+        return to_cik(owner['cik']) if owner else None
 
+    @extractor(2)
     def find_cusip(self):
-        if self.content is None:
-            return 'No CUSIP'
-
-        # Patterns with \s+ to match one or more whitespace characters
-        patterns = [
-            re.compile(r'\b[0-9A-Z]{1}[0-9]{3}[0-9A-Za-z]{2}[-\s]*[0-9]{0,2}[-\s]*[0-9]{0,1}\b'),
-            re.compile(r'\b[0-9]{5}\s+[A-Z]\s+[0-9]{2}\s+[0-9]{1}\b'),
-            re.compile(r'\b[0-9]{3}\s+[0-9]{3}\s+[0-9]{2}\s+[0-9]{1}\b'),
-            re.compile(r'\b[0-9]{3}\s+[0-9]{3}\s+[0-9]{3}\b'),
-            re.compile(r'\b[0-9]{9}\b'),
-            re.compile(r'\b[0-9]{4}[A-Z]{1}\s+[0-9]{2}\s+[0-9]{1}\b'),
-            re.compile(r'\b[0-9]{5}[A-Z][0-9]{3}\b'),
-            re.compile(r'\b[0-9]{5}\s+[0-9]{2}\s+[0-9]{1}\b'),
-            re.compile(r'\b[0-9A-Z]{6}\s{2}[0-9]{3}\b'),
-            re.compile(r'\b\d{4} \d{5}\b')
-        ]
-
-        lines = self.content.splitlines()
-        for i, line in enumerate(lines):
-            if 'cusip' in line.casefold():
-                for j in range(max(0, i-10), min(len(lines), i+10)):
-                    for pattern in patterns:
-                        match = pattern.search(lines[j])
-                        if match:
-                            # Remove spaces and dashes, then strip any surrounding angle brackets or other characters
-                            cusip_add = re.sub(r'[\s-]+', '', match.group())
-                            return cusip_add
-        return 'No CUSIP'
+        if self.header is None:
+            return None
+        cusip = self.search(lambda text: find_cusip(text.lines), 'No CUSIP')
+        return None if cusip == 'No CUSIP' else cusip
 
+    @extractor(2)
     def find_nb_shares_agg(self):
+        return to_shares(self.cover_page['shares_agg'])
 
-        return find_nb_shares(self.content,
-                              ['aggregate amount', 'amount beneficially owned', 'item 11'],
-                              'Check if the Aggregate Amount',
-                              20)
-
+    @extractor(2)
     def find_nb_shares_sole_voting(self):
-        return find_nb_shares(self.content,
-                              ['sole voting', 'item 7'],
-                              'shared voting power',
-                              20)
+        return to_shares(self.cover_page['shares_sole_vote'])
 
+    @extractor(2)
     def find_nb_shares_shared_voting(self):
-        return find_nb_shares(self.content,
-                              ['shared voting', 'item 8'],
-                              'sole dispositive power',
-                              20)
+        return to_shares(self.cover_page['shares_shared_vote'])
 
+    @extractor(2)
     def find_nb_shares_sole_dispositive(self):
-        return find_nb_shares(self.content,
-                              ['sole dispositive', 'sole disposition', 'item 9'],
-                              'shared dispositive power',
-                              20)
+        return to_shares(self.cover_page['shares_sole_dispositive'])
 
+    @extractor(2)
     def find_nb_shares_shared_dispositive(self):
-        return find_nb_shares(self.content,
-                              ['shared dispositive', 'shared disposition', 'item 10'],
-                              'aggregate amount beneficially',
-                              20)
+        return to_shares(self.cover_page['shares_shared_dispositive'])
 
+    @extractor(2)
     def find_percentage_owned(self):
-        return find_percentage(self.content,
-                               ['percent of class', 'class represented by', 'item 13'],
-                               'type of reporting',
-                               20)
+        return to_percentage(self.cover_page['shares_percentage'])
 
 
 if __name__ == '__main__':
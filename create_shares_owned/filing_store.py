@@ -0,0 +1,196 @@
+# python '18_shares_owned/create_shares_owned/filing_store.py' '17_data_new/13D'
+
+# Filings are downloaded as one .txt file per filing in {folder}/{year}_{month}/. Once a month is
+# complete, its folder can be packed into a compressed shard {folder}/{year}_{month}.zip holding the
+# same file names. The central directory of the zip is the index accession -> offset, so a filing
+# is read without decompressing the rest of the shard.
+#
+# The file paths don't change: '17_data_new/13D/2002_02/1056084_2002-02-14_000758.txt' is read from
+# the loose file if it exists, otherwise from the member 1056084_2002-02-14_000758.txt of
+# 17_data_new/13D/2002_02.zip. The paths stored in 13D.csv, public_file_data, shares_owned, ...
+# stay valid whatever the storage, and every reader goes through open_filing / read_filing.
+
+import argparse
+import hashlib
+import io
+import locale
+import os
+import time
+import zipfile
+from datetime import datetime
+from functools import lru_cache
+from glob import glob
+
+
+def open_shard(shard_path):
+    """
+    Returns the opened shard. The cache is keyed on the modification time and the size of the shard,
+    so a reader sees the filings appended to it by pack_month, in this process or another one.
+    """
+    stat = os.stat(shard_path)
+    return cached_shard(shard_path, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=32)
+def cached_shard(shard_path, mtime, size):
+    return zipfile.ZipFile(shard_path)
+
+
+def locate(file_path):
+    """
+    Returns (shard_path, member_name) for a filing stored in a shard, None for a loose file.
+    """
+    if os.path.exists(file_path):
+        return None
+    month_dir, name = os.path.split(file_path)
+    shard_path = month_dir + ".zip"
+    if os.path.exists(shard_path):
+        return shard_path, name
+    return None
+
+
+def filing_exists(file_path):
+    location = locate(file_path)
+    if location is None:
+        return os.path.exists(file_path)
+    return location[1] in open_shard(location[0]).NameToInfo
+
+
+def open_filing(file_path, mode="r"):
+    """
+    Opens a filing, loose or packed, as open(file_path, mode) would: 'r' returns a text file
+    decoded with the default encoding, 'rb' a binary file. Raises FileNotFoundError if the
+    filing isn't stored anywhere.
+    """
+    location = locate(file_path)
+    if location is None:
+        return open(file_path, mode)
+    shard_path, name = location
+    try:
+        member = open_shard(shard_path).open(name)
+    except KeyError:
+        raise FileNotFoundError(file_path)
+    return member if mode == "rb" else io.TextIOWrapper(member)
+
+
+def read_filing_bytes(file_path):
+    with open_filing(file_path, "rb") as f:
+        return f.read()
+
+
+def decode_filing(data):
+    """
+    Decodes the bytes of a filing as open(file_path, 'r') would, with the default encoding and
+    universal newlines. Undecodable bytes are replaced instead of raising an error.
+    """
+    text = data.decode(locale.getpreferredencoding(False), errors='replace')
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def read_filing(file_path):
+    with open_filing(file_path) as f:
+        return f.read()
+
+
+def filing_hash(file_path, chunk_size=1 << 20):
+    """
+    Returns the sha1 of a filing, read by chunks.
+    """
+    sha1 = hashlib.sha1()
+    with open_filing(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def list_filings(folder):
+    """
+    Returns the paths of all the filings of a download folder, loose ({folder}/{year}_{month}/*)
+    and packed ({folder}/{year}_{month}.zip). Packed filings are listed from the central directory
+    of the shards, without walking the file system.
+    """
+    files = glob(folder + '/*/*')
+    for shard_path in sorted(glob(folder + '/*.zip')):
+        month_dir = shard_path[:-len(".zip")]
+        files.extend(os.path.join(month_dir, name) for name in open_shard(shard_path).namelist())
+    return files
+
+
+def filing_mtimes(folder):
+    """
+    Returns {file path: modification time} for all the filings of a download folder, with the
+    same paths as list_filings. The time of a packed filing is the one recorded in the shard,
+    which has a resolution of 2 seconds.
+    """
+    mtimes = {}
+    for month_dir in glob(folder + '/*/'):
+        with os.scandir(month_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    mtimes[os.path.join(month_dir.rstrip("/\\"), entry.name)] = entry.stat().st_mtime
+    for shard_path in sorted(glob(folder + '/*.zip')):
+        month_dir = shard_path[:-len(".zip")]
+        for info in open_shard(shard_path).infolist():
+            mtimes[os.path.join(month_dir, info.filename)] = time.mktime(info.date_time + (0, 0, -1))
+    return mtimes
+
+
+def filing_mtime(file_path):
+    location = locate(file_path)
+    if location is None:
+        return os.path.getmtime(file_path)
+    info = open_shard(location[0]).getinfo(location[1])
+    return time.mktime(info.date_time + (0, 0, -1))
+
+
+def filing_size(file_path):
+    location = locate(file_path)
+    if location is None:
+        return os.path.getsize(file_path)
+    return open_shard(location[0]).getinfo(location[1]).file_size
+
+
+def pack_month(month_dir, compresslevel=6):
+    """
+    This function moves the filings of a month folder into the shard {month_dir}.zip, appending
+    to the shard if it already exists. The loose files are only removed once the shard has been
+    closed and all of them are listed in it. Returns the number of filings packed.
+    """
+    shard_path = month_dir + ".zip"
+    cached_shard.cache_clear()
+    names = sorted(os.listdir(month_dir))
+    with zipfile.ZipFile(shard_path, "a", compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as shard:
+        present = set(shard.namelist())
+        for name in names:
+            if name not in present:
+                shard.write(os.path.join(month_dir, name), name)
+
+    with zipfile.ZipFile(shard_path) as shard:
+        present = set(shard.namelist())
+    if all(name in present for name in names):
+        for name in names:
+            os.remove(os.path.join(month_dir, name))
+        os.rmdir(month_dir)
+    return len(names)
+
+
+def pack_folder(folder, include_current_month=False):
+    """
+    Packs every month folder of a download folder. The current month is left loose by default,
+    since the downloader is still adding filings to it.
+    """
+    current = datetime.now().strftime("%Y_%m")
+    for month_dir in sorted(glob(folder + '/*/')):
+        month_dir = month_dir.rstrip("/\\")
+        if os.path.basename(month_dir) == current and not include_current_month:
+            continue
+        print(f"{month_dir}: {pack_month(month_dir)} filings packed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder")
+    parser.add_argument("--include-current-month", action="store_true")
+    args = parser.parse_args()
+
+    pack_folder(args.folder, args.include_current_month)
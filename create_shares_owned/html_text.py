@@ -0,0 +1,101 @@
+# Text of the HTML filings, as searched by filing_parser.py and sec_file_finder.py.
+#
+# The filing is fed by chunks to the HTML parser of lxml, which calls a target object for each tag
+# and each piece of text instead of building a tree. The text is written as it arrives: block tags
+# (p, div, br, tr, td, ...) end the current line, other tags are replaced by a space, the whitespace
+# of a line is collapsed (the newlines of the HTML source don't split a sentence anymore), except in
+# <pre> and in the SEC header whose lines are kept, and the text of <script> and <style> is dropped.
+# The conversion stops once max_chars characters of text have been written, the cover page being at
+# the beginning of the filing.
+
+from lxml import etree
+
+block_tags = {
+    'address', 'blockquote', 'body', 'br', 'caption', 'center', 'dd', 'div', 'dl', 'dt', 'form', 'h1', 'h2',
+    'h3', 'h4', 'h5', 'h6', 'head', 'hr', 'html', 'li', 'ol', 'p', 'pre', 'table', 'tbody', 'td', 'tfoot',
+    'th', 'thead', 'title', 'tr', 'ul',
+    # SGML tags of the EDGAR submission around the documents.
+    'sec-document', 'sec-header', 'document', 'type', 'sequence', 'filename', 'description', 'text', 'page',
+}
+skipped_tags = {'script', 'style'}
+# Tags whose text keeps its lines.
+preformatted_tags = {'pre', 'sec-header'}
+
+
+class TextCollector:
+    """
+    Target of the lxml HTML parser. Receives the tags and the text in document order and keeps the
+    lines of text written so far, without any recursion whatever the nesting of the document.
+    """
+
+    def __init__(self, max_chars=None):
+        self.max_chars = max_chars
+        self.full = False
+        self.lines = []
+        self.parts = []
+        self.size = 0
+        self.skip = 0
+        self.pre = 0
+
+    def start(self, tag, attrib):
+        tag = tag.lower() if isinstance(tag, str) else ''
+        if tag in skipped_tags:
+            self.skip += 1
+        elif tag in preformatted_tags:
+            self.pre += 1
+        self.separate(tag)
+
+    def end(self, tag):
+        tag = tag.lower() if isinstance(tag, str) else ''
+        if tag in skipped_tags:
+            self.skip = max(0, self.skip - 1)
+        elif tag in preformatted_tags:
+            self.pre = max(0, self.pre - 1)
+        self.separate(tag)
+
+    def data(self, data):
+        if self.skip or self.full:
+            return
+        if self.pre:
+            # The lines of preformatted text are kept.
+            *lines, rest = data.split('\n')
+            for line in lines:
+                self.parts.append(line)
+                self.flush()
+            self.parts.append(rest)
+        else:
+            self.parts.append(data)
+
+    def separate(self, tag):
+        if tag in block_tags:
+            self.flush()
+        else:
+            self.parts.append(' ')
+
+    def flush(self):
+        line = ' '.join(''.join(self.parts).split())
+        self.parts = []
+        if line and not self.full:
+            self.lines.append(line)
+            self.size += len(line) + 1
+            self.full = self.max_chars is not None and self.size >= self.max_chars
+
+    def close(self):
+        self.flush()
+        return '\n'.join(self.lines)
+
+
+def html_to_text(html, max_chars=None, chunk_size=1 << 16):
+    """
+    This function returns the text of an HTML document, one line per block.
+    Argument 1: the document, str or bytes.
+    Argument 2: number of characters of text after which the conversion stops, None for the whole document.
+    Argument 3: size of the chunks fed to the parser.
+    """
+    collector = TextCollector(max_chars)
+    parser = etree.HTMLParser(target=collector)
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start:start + chunk_size])
+        if collector.full:
+            break
+    return parser.close()
@@ -27,6 +27,15 @@ if len(list_argument) == 0 or 'download_files.py' in list_argument:
     command = ['python', '18_shares_owned/create_shares_owned/download_files.py', '13G', '17_data_new/13G']
     subprocess.run(command)
 
+# Run scan_corpus.py (launched with 'scan_corpus.py' only)
+# Single pass replacing cusip_parser.py, create_cusip_mapping.py and find_public.py: creates 13D.csv, 13G.csv,
+# cusips.parquet, cik-cusip-maps.csv, cik-cusip-intervals.csv and public_file_data.
+# Arguments: the folders in which the filings are.
+if 'scan_corpus.py' in list_argument:
+    print('start scan_corpus.py')
+    command = ['python', '18_shares_owned/create_shares_owned/scan_corpus.py', '17_data_new/13D', '17_data_new/13G']
+    subprocess.run(command)
+
 # Run all_cik
 # This creates a .csv with the cusip, cik and cik owner.
 # Argument 1: the folders in which the filings are.
@@ -39,7 +48,7 @@ if len(list_argument) == 0 or 'cusip_parser.py' in list_argument:
     subprocess.run(command)
 
 # Run post_proc.py
-# This creates cik-cusip-maps.csv
+# This creates cik-cusip-maps.csv and cik-cusip-intervals.csv
 # Argument 1: .csv filings with cik and cuisp.
 # Argument 2: .csv filings with cik and cuisp.
 # Argument 3: ...
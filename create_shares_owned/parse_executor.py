@@ -0,0 +1,200 @@
+# Worker processes of scrap.py and cusip_parser.py, with a watchdog.
+#
+# A few filings (deep HTML nesting, exhibits of several MB) can keep a worker busy for minutes or crash it,
+# and a multiprocessing.Pool then waits for them until the end of the run. Here each worker receives its
+# chunks of files through its own pipe and answers after each file, so the main process knows which file
+# every worker is on and since when:
+# - a file taking more than `timeout` seconds: the worker is terminated and replaced, the file is quarantined
+#   and the rest of its chunk is given to another worker;
+# - a worker that dies (segfault, recursion limit of the C stack), or a file raising an exception: the file
+#   is quarantined;
+# - a worker is replaced after max_tasks_per_child files, or when its memory (resident set size, read with
+#   psutil) exceeds max_memory bytes. Above max_memory while on a file, the file is quarantined.
+# The quarantined files are appended to a csv (file_path, reason, seconds) written alongside the output.
+
+import csv
+import os
+import time
+from collections import deque
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+
+
+def worker_loop(function, connection):
+    """
+    Runs in the worker: applies the function to each item of the chunks received, and sends back
+    ('done', item, result) or ('error', item, message) for each item, then ('chunk', None, None).
+    """
+    while True:
+        try:
+            chunk = connection.recv()
+        except EOFError:
+            return
+        if chunk is None:
+            return
+        for item in chunk:
+            try:
+                message = ('done', item, function(item))
+            except Exception as error:
+                message = ('error', item, f'{type(error).__name__}: {error}')
+            connection.send(message)
+        connection.send(('chunk', None, None))
+
+
+class Worker:
+    """
+    A worker process, the chunk it is working on (the items not answered yet), the time its current
+    item started and the number of items it processed.
+    """
+
+    def __init__(self, function):
+        self.connection, child_connection = Pipe()
+        self.process = Process(target=worker_loop, args=(function, child_connection), daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.chunk = None
+        self.started = None
+        self.tasks = 0
+
+    def send(self, chunk):
+        self.chunk = deque(chunk)
+        self.started = time.monotonic()
+        self.connection.send(list(chunk))
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+
+
+class ParseExecutor:
+    """
+    The ParseExecutor object applies a function to items (file paths) in worker processes.
+
+    - imap_unordered: yields the result of each item, in the order they are completed. The items
+      quarantined have no result.
+    - quarantined: number of items quarantined so far.
+    """
+
+    def __init__(self, function, workers=4, timeout=300, chunksize=1, max_tasks_per_child=1000,
+                 max_memory=None, quarantine_path=None):
+        self.function = function
+        self.workers = workers
+        self.timeout = timeout
+        self.chunksize = chunksize
+        self.max_tasks_per_child = max_tasks_per_child
+        self.max_memory = max_memory
+        self.quarantine_path = quarantine_path
+        self.quarantined = 0
+        self.psutil = None
+        if max_memory:
+            # Only needed for the memory ceiling.
+            import psutil
+            self.psutil = psutil
+
+    def quarantine(self, item, reason, started):
+        self.quarantined += 1
+        seconds = round(time.monotonic() - started, 1)
+        print(f'Quarantined {item} ({reason}, {seconds} seconds).')
+        if self.quarantine_path is None:
+            return
+        new = not os.path.exists(self.quarantine_path)
+        with open(self.quarantine_path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(['file_path', 'reason', 'seconds'])
+            writer.writerow([item, reason, seconds])
+
+    def memory(self, worker):
+        try:
+            return self.psutil.Process(worker.process.pid).memory_info().rss
+        except self.psutil.Error:
+            return 0
+
+    def replace(self, worker, pending, reason):
+        """
+        Kills a worker stuck on the first item of its chunk, quarantines the item and puts the rest of
+        the chunk back in front of the pending chunks.
+        """
+        worker.kill()
+        if not worker.chunk:
+            # All its items were answered.
+            return Worker(self.function)
+        self.quarantine(worker.chunk.popleft(), reason, worker.started)
+        if worker.chunk:
+            pending.appendleft(list(worker.chunk))
+        return Worker(self.function)
+
+    def imap_unordered(self, items):
+        items = list(items)
+        pending = deque(items[start:start + self.chunksize] for start in range(0, len(items), self.chunksize))
+        workers = [Worker(self.function) for _ in range(min(self.workers, len(pending)))]
+        try:
+            while True:
+                for worker in workers:
+                    if worker.chunk is None and pending:
+                        worker.send(pending.popleft())
+                busy = [worker for worker in workers if worker.chunk is not None]
+                if not busy:
+                    return
+
+                ready = wait([worker.connection for worker in busy], timeout=1)
+                for i, worker in enumerate(workers):
+                    if worker.connection not in ready:
+                        continue
+                    try:
+                        kind, item, value = worker.connection.recv()
+                    except (EOFError, OSError):
+                        workers[i] = self.replace(worker, pending, 'crashed')
+                        continue
+                    if kind == 'chunk':
+                        worker.chunk = None
+                        if worker.tasks >= self.max_tasks_per_child or \
+                                (self.max_memory and self.memory(worker) > self.max_memory):
+                            worker.stop()
+                            workers[i] = Worker(self.function)
+                        continue
+                    worker.chunk.popleft()
+                    worker.tasks += 1
+                    if kind == 'error':
+                        self.quarantine(item, value, worker.started)
+                    worker.started = time.monotonic()
+                    if kind == 'done':
+                        yield value
+
+                now = time.monotonic()
+                for i, worker in enumerate(workers):
+                    # The answers waiting in the pipe are read first, the consumer of the results can be
+                    # slower than the workers.
+                    if not worker.chunk or worker.connection.poll():
+                        continue
+                    if now - worker.started > self.timeout:
+                        workers[i] = self.replace(worker, pending, 'timeout')
+                    elif self.max_memory and self.memory(worker) > self.max_memory:
+                        workers[i] = self.replace(worker, pending, 'memory')
+        finally:
+            for worker in workers:
+                if worker.chunk is None:
+                    worker.stop()
+                else:
+                    worker.kill()
+
+
+def load_quarantine(quarantine_path):
+    """
+    Returns the set of the file paths of a quarantine csv, empty if it doesn't exist.
+    """
+    try:
+        with open(quarantine_path, 'r', newline='') as f:
+            return {row['file_path'] for row in csv.DictReader(f)}
+    except FileNotFoundError:
+        return set()
@@ -0,0 +1,76 @@
+# Checkpointed output of scrap.py.
+#
+# The rows are written by batches to numbered Parquet part files in a folder (part-00000.parquet, ...),
+# each one written to a temporary name and renamed once complete, so a crash or a Ctrl-C never leaves a
+# truncated part. The file paths of the parts are the filings already done: a run started again reads
+# them back and only parses the others. Once every filing is done, the parts are copied one by one (one
+# row group per part) into the final Parquet file. The memory used doesn't depend on the number of filings.
+
+import os
+import shutil
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class PartWriter:
+    """
+    The PartWriter object writes rows (dicts) to the part files of parts_dir.
+
+    - done: the file paths of the rows already written by this run and the former ones.
+    - write: adds a row, the batch is written once it holds batch_size rows.
+    - flush: writes the rows of the current batch, if any. Returns the number of rows written.
+    - finalize: writes the rows of all the parts to a single Parquet file and removes parts_dir.
+    """
+
+    def __init__(self, parts_dir, schema, batch_size=5000, key='file_path'):
+        self.parts_dir = parts_dir
+        self.schema = schema
+        self.batch_size = batch_size
+        self.key = key
+        self.rows = []
+        os.makedirs(parts_dir, exist_ok=True)
+        # Temporary files of a part that was being written when the former run stopped.
+        for name in os.listdir(parts_dir):
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(parts_dir, name))
+        self.parts = self.list_parts()
+        self.done = set()
+        for part in self.parts:
+            self.done.update(pq.read_table(part, columns=[key]).column(key).to_pylist())
+
+    def list_parts(self):
+        return sorted(os.path.join(self.parts_dir, name) for name in os.listdir(self.parts_dir)
+                      if name.startswith('part-') and name.endswith('.parquet'))
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return 0
+        part = os.path.join(self.parts_dir, f'part-{len(self.parts):05d}.parquet')
+        pq.write_table(pa.Table.from_pylist(self.rows, schema=self.schema), part + '.tmp')
+        os.replace(part + '.tmp', part)
+        self.parts.append(part)
+        self.done.update(row[self.key] for row in self.rows)
+        written = len(self.rows)
+        self.rows = []
+        return written
+
+    def finalize(self, output_path):
+        """
+        Writes the rows of the parts to output_path (replaced atomically) and removes parts_dir.
+        Returns the number of rows written.
+        """
+        self.flush()
+        rows = 0
+        with pq.ParquetWriter(output_path + '.tmp', self.schema) as writer:
+            for part in self.parts:
+                table = pq.read_table(part, schema=self.schema)
+                writer.write_table(table)
+                rows += table.num_rows
+        os.replace(output_path + '.tmp', output_path)
+        shutil.rmtree(self.parts_dir)
+        return rows
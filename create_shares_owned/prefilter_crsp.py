@@ -0,0 +1,71 @@
+# python '18_shares_owned/create_shares_owned/prefilter_crsp.py' --subjects
+# python '18_shares_owned/create_shares_owned/scrap.py' --input '17_data_new/public_file_data_crsp'
+
+# Optional stage between find_publicly_traded_owners.py (or scan_corpus.py) and scrap.py. Only the
+# filings whose owner is in CRSP are kept: merge_crsp_shares_owned.py removes the other ones with its
+# semi-join on the ciks of short_crsp_data.csv (create_pair_data/crsp_add_cik.py), so scrap.py doesn't
+# need to parse them. With --subjects, the filings whose subject company can't be in CRSP either are
+# also removed: its cik isn't in short_crsp_data.csv and the cusip6 found by cusip_parser.py isn't one of
+# the CRSP cusip6. This second filter relies on the cusip of cusip_parser.py, which can differ from the
+# one found by scrap.py, so it can remove a few filings that merge_crsp_shares_owned.py would have kept.
+
+import argparse
+import pandas as pd
+
+
+def read_crsp_keys(crsp_path, chunksize=1_000_000):
+    """
+    This function returns the set of the ciks and the set of the cusip6 of short_crsp_data.csv, read by
+    chunks of only these two columns.
+    """
+    ciks = set()
+    cusip6s = set()
+    for chunk in pd.read_csv(crsp_path, usecols=['CUSIP6', 'CIK'], dtype=str, chunksize=chunksize):
+        ciks.update(pd.to_numeric(chunk['CIK'], errors='coerce').dropna().astype('int64').unique())
+        cusip6s.update(chunk['CUSIP6'].dropna().unique())
+    return ciks, cusip6s
+
+
+def prefilter(public_data, ciks, cusip6s=None):
+    """
+    This function returns the filings of public_file_data that can be in the output of
+    merge_crsp_shares_owned.py, with the number of filings removed at each step.
+    Argument 1: DataFrame of public_file_data (file_path, cik_company, cik_owner, cusip).
+    Argument 2: set of the ciks of CRSP.
+    Argument 3: set of the cusip6 of CRSP, to also filter on the subject company. None to only filter on
+    the owner.
+    """
+    removed = {}
+    cik_owner = pd.to_numeric(public_data['cik_owner'], errors='coerce')
+    keep = cik_owner.isin(ciks)
+    removed['owner not in CRSP'] = int((~keep).sum())
+
+    if cusip6s is not None:
+        cik_company = pd.to_numeric(public_data['cik_company'], errors='coerce')
+        cusip6 = public_data['cusip'].astype('string').str[:6]
+        subject = cik_company.isin(ciks) | cusip6.isin(cusip6s)
+        removed['subject not in CRSP'] = int((keep & ~subject).sum())
+        keep &= subject
+
+    return public_data[keep], removed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--public', default='17_data_new/public_file_data', help='public_file_data to filter')
+    parser.add_argument('--crsp', default='17_data_new/short_crsp_data.csv', help='written by crsp_add_cik.py')
+    parser.add_argument('--output', default='17_data_new/public_file_data_crsp')
+    parser.add_argument('--subjects', action='store_true',
+                        help='also remove the filings whose subject company is not in CRSP')
+    args = parser.parse_args()
+
+    public_data = pd.read_csv(args.public, index_col=0, dtype=str)
+    ciks, cusip6s = read_crsp_keys(args.crsp)
+    print(f'{len(ciks)} ciks and {len(cusip6s)} cusip6 in CRSP.')
+
+    filtered, removed = prefilter(public_data, ciks, cusip6s if args.subjects else None)
+    for step, count in removed.items():
+        print(f'{count} filings removed: {step}.')
+    print(f'{len(filtered)} filings kept on {len(public_data)} '
+          f'({len(public_data) - len(filtered)} cut, {(len(public_data) - len(filtered)) / max(len(public_data), 1):.1%}).')
+    filtered.to_csv(args.output)
@@ -0,0 +1,80 @@
+# Cache of the values extracted from the filings by scrap.py, one row per (file hash, field, version).
+#
+# Each find_* method of FileSec carries the version of its rules (see filing_parser.extractor). A value
+# is reused as long as the filing (its sha1) and the version of the method that computed it are the
+# same, so after a change of one heuristic, e.g. find_percentage_owned, a run of scrap.py only
+# recomputes that column. The worker processes read the cache, the main process writes the new values.
+
+import json
+import os
+import sqlite3
+
+
+class ResultCache:
+    """
+    The ResultCache object stores the values of the fields of each filing in a SQLite database.
+
+    - lookup: the values stored for a filing with the current versions of the fields.
+    - store: adds (file_hash, field, version, value) rows. The values are stored as JSON, so None,
+      numbers and strings are returned as they were.
+    - prune: removes the values computed by former versions of the fields.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "file_hash TEXT NOT NULL, field TEXT NOT NULL, version TEXT NOT NULL, value TEXT, "
+            "PRIMARY KEY (file_hash, field, version))"
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def lookup(self, file_hash, versions):
+        """
+        Argument 1: sha1 of the filing.
+        Argument 2: {field: current version}.
+        Returns {field: value} for the fields stored with their current version.
+        """
+        found = {}
+        for field, version, value in self.connection.execute(
+                "SELECT field, version, value FROM results WHERE file_hash = ?", (file_hash,)):
+            if versions.get(field) == version:
+                found[field] = json.loads(value)
+        return found
+
+    def store(self, rows):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO results (file_hash, field, version, value) VALUES (?, ?, ?, ?)",
+            ((file_hash, field, version, json.dumps(value)) for file_hash, field, version, value in rows)
+        )
+
+    def commit(self):
+        self.connection.commit()
+
+    def prune(self, versions):
+        """
+        Removes the rows of the fields whose version isn't the current one. Returns the number of rows removed.
+        """
+        before = self.connection.total_changes
+        for field, version in versions.items():
+            self.connection.execute("DELETE FROM results WHERE field = ? AND version != ?", (field, version))
+        self.connection.commit()
+        return self.connection.total_changes - before
+
+
+open_caches = {}
+
+
+def worker_cache(db_path):
+    """
+    Returns the ResultCache of db_path opened by the current process, opening it on first use.
+    """
+    key = (db_path, os.getpid())
+    if key not in open_caches:
+        open_caches[key] = ResultCache(db_path)
+    return open_caches[key]
@@ -0,0 +1,160 @@
+# python '18_shares_owned/create_shares_owned/scan_corpus.py' '17_data_new/13D' '17_data_new/13G'
+
+# Single pass over the 13D and 13G filings, instead of cusip_parser.py followed by create_cusip_mapping.py
+# and find_publicly_traded_owners.py, which read both csv again with dtype=str.
+#
+# Each filing is parsed by cusip_parser.parse in the workers of parse_executor.py. As the rows arrive,
+# by batches of batch_size:
+# - they are written to 13D.csv / 13G.csv (same format as cusip_parser.py, with the state files used by
+#   cusip_parser.py --incremental), and to cusips.parquet (form, ciks as int64);
+# - the counts and dates of each cusip6-cik pair are added to the running totals (create_cusip_mapping.py),
+#   and the ciks of the subject companies to the set of public companies.
+# At the end, cik-cusip-maps.csv and cik-cusip-intervals.csv are written from the totals, and
+# public_file_data from cusips.parquet (the filings whose owner is a subject company of another filing).
+
+import argparse
+import csv
+import os
+from functools import partial
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from create_cusip_mapping import clean_cusips, cusip_intervals, merge_pair_counts, most_frequent_cik, pair_counts
+from cusip_parser import parse
+from filing_store import filing_mtimes
+from parse_executor import ParseExecutor
+
+SCHEMA = pa.schema([
+    ("file_path", pa.string()),
+    ("form", pa.string()),
+    ("cik", pa.int64()),
+    ("cik_owner", pa.int64()),
+    ("cusip", pa.string()),
+])
+
+
+class CorpusScan:
+    """
+    The CorpusScan object receives the rows of cusip_parser.parse ([file, cik, cik_owner, cusip], the
+    ciks as str) and keeps the aggregates of the stage.
+
+    - add: adds a row of a form (13D or 13G), the batch is processed once it holds batch_size rows.
+    - flush: writes the rows of the batch to cusips.parquet and adds them to the aggregates.
+    - close: writes cik-cusip-maps.csv, cik-cusip-intervals.csv and public_file_data.
+    """
+
+    def __init__(self, output_dir, batch_size=100_000):
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.parquet_path = os.path.join(output_dir, 'cusips.parquet')
+        self.writer = pq.ParquetWriter(self.parquet_path + '.tmp', SCHEMA)
+        self.rows = []
+        self.pairs = None
+        # ciks of the subject companies of the filings with both ciks.
+        self.companies = set()
+
+    def add(self, form, row):
+        self.rows.append([form] + row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        df = pd.DataFrame(self.rows, columns=['form', 'f', 'cik', 'cik_owner', 'cusip'], dtype=object)
+        self.rows = []
+
+        self.pairs = merge_pair_counts(self.pairs, pair_counts(clean_cusips(df.drop(columns='form'))))
+        both = df.dropna(subset=['cik', 'cik_owner'])
+        self.companies.update(pd.to_numeric(both['cik']))
+
+        table = pd.DataFrame({
+            'file_path': df['f'],
+            'form': df['form'],
+            'cik': pd.to_numeric(df['cik']).astype('Int64'),
+            'cik_owner': pd.to_numeric(df['cik_owner']).astype('Int64'),
+            'cusip': df['cusip'],
+        })
+        self.writer.write_table(pa.Table.from_pandas(table, schema=SCHEMA, preserve_index=False))
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        os.replace(self.parquet_path + '.tmp', self.parquet_path)
+
+        pairs = self.pairs if self.pairs is not None else pair_counts(clean_cusips(
+            pd.DataFrame(columns=['f', 'cik', 'cik_owner', 'cusip'], dtype=object)))
+        most_frequent_cik(pairs).to_csv(os.path.join(self.output_dir, 'cik-cusip-maps.csv'), index=False)
+        cusip_intervals(pairs).to_csv(os.path.join(self.output_dir, 'cik-cusip-intervals.csv'), index=False,
+                                      date_format='%Y-%m-%d')
+
+        # Filter rows where 'cik_owner' values are also found in 'cik' column
+        filings = pq.read_table(self.parquet_path, columns=['file_path', 'cik', 'cik_owner', 'cusip'])
+        filings = filings.to_pandas().dropna(subset=['cik', 'cik_owner']).astype({'cik': 'int64', 'cik_owner': 'int64'})
+        print(f'The length before removing non-public company owners is {len(filings)}.')
+        public = filings[filings['cik_owner'].isin(self.companies)]
+        print(f'The length after removing non-public company owners is {len(public)}')
+        public = public.rename(columns={'cik': 'cik_company'}).reset_index(drop=True)
+        public.to_csv(os.path.join(self.output_dir, 'public_file_data'))
+
+
+def scan_folder(folder, scan, executor):
+    """
+    This function parses the filings of a download folder, writes {folder}.csv and {folder}.state.csv
+    as cusip_parser.py does, and adds the rows to the scan.
+    """
+    form = os.path.basename(os.path.normpath(folder))
+    mtimes = filing_mtimes(folder)
+    files = list(mtimes)
+    print(f'{form}: {len(files)} filings.')
+
+    written = []
+    output_path = folder + '.csv'
+    with open(output_path + '.tmp', 'w', newline='') as out:
+        wr = csv.writer(out)
+        for i, res in enumerate(executor.imap_unordered(files)):
+            if i % 10000 == 0:
+                print(f'{i} on {len(files)}.')
+            wr.writerow(res)
+            written.append(res[0])
+            scan.add(form, res)
+    os.replace(output_path + '.tmp', output_path)
+
+    state_path = folder + '.state.csv'
+    with open(state_path + '.tmp', 'w', newline='') as f:
+        csv.writer(f).writerows([file, mtimes[file]] for file in written)
+    os.replace(state_path + '.tmp', state_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('folders', nargs='+', help='download folders, e.g. 17_data_new/13D 17_data_new/13G')
+    parser.add_argument('--output-dir', default='17_data_new')
+    parser.add_argument('--batch-size', type=int, default=100_000, help='rows added to the aggregates at once')
+    parser.add_argument('--max-lines', type=int, default=None,
+                        help='lines of the document scanned for the CUSIP at most')
+    parser.add_argument('--max-bytes', type=int, default=1_000_000,
+                        help='characters of the document scanned for the CUSIP at most')
+    parser.add_argument('--workers', type=int, default=5, help='number of worker processes')
+    parser.add_argument('--chunksize', type=int, default=100, help='number of filings sent to a worker at once')
+    parser.add_argument('--timeout', type=float, default=120,
+                        help='seconds a filing can take before its worker is replaced and the filing quarantined')
+    parser.add_argument('--max-tasks-per-child', type=int, default=10000,
+                        help='number of filings after which a worker is replaced')
+    parser.add_argument('--max-memory', type=int, default=None,
+                        help='memory of a worker in bytes above which it is replaced (requires psutil)')
+    args = parser.parse_args()
+
+    scan = CorpusScan(args.output_dir, args.batch_size)
+    for folder in args.folders:
+        quarantine_path = folder + '.quarantine.csv'
+        if os.path.exists(quarantine_path):
+            os.remove(quarantine_path)
+        executor = ParseExecutor(partial(parse, max_lines=args.max_lines, max_bytes=args.max_bytes),
+                                 workers=args.workers, timeout=args.timeout, chunksize=args.chunksize,
+                                 max_tasks_per_child=args.max_tasks_per_child, max_memory=args.max_memory,
+                                 quarantine_path=quarantine_path)
+        scan_folder(folder, scan, executor)
+        if executor.quarantined:
+            print(f'{executor.quarantined} filings quarantined, see {quarantine_path}.')
+    scan.close()
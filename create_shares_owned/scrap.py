@@ -1,52 +1,204 @@
-from filing_parser import FileSec
+from filing_parser import FileSec, normalizer_version
+from filing_store import filing_hash
+from extraction_profile import ProfileWriter, profile_record, report
+from functools import partial
+from result_cache import ResultCache, worker_cache
+import argparse
+import os
 import pandas as pd
+import pyarrow as pa
+import shutil
+import text_cache
 import time
-from multiprocessing import Pool
+from parse_executor import ParseExecutor, load_quarantine
+from part_writer import PartWriter
 from tqdm import tqdm
 
+# Columns of the output and the FileSec methods computing them.
+FIELDS = {
+    "file_type": "find_file_type",
+    "date_issue": "find_issue_date",
+    "date_transaction": "find_transaction_date",
+    "cusips": "find_cusip",
+    "company": "find_company_name",
+    "cik": "find_company_cik",
+    "owner": "find_owner_name",
+    "cik_owner": "find_owner_cik",
+    "shares_agg": "find_nb_shares_agg",
+    "shares_sole_vote": "find_nb_shares_sole_voting",
+    "shares_shared_vote": "find_nb_shares_shared_voting",
+    "shares_sole_dispositive": "find_nb_shares_sole_dispositive",
+    "shares_shared_dispositive": "find_nb_shares_shared_dispositive",
+    "shares_percentage": "find_percentage_owned",
+}
+# Types of the output, the missing values are nulls.
+SCHEMA = pa.schema([
+    ("file_path", pa.string()),
+    ("file_type", pa.string()),
+    ("date_issue", pa.string()),
+    ("date_transaction", pa.string()),
+    ("cusips", pa.string()),
+    ("company", pa.string()),
+    ("cik", pa.int64()),
+    ("owner", pa.string()),
+    ("cik_owner", pa.int64()),
+    ("shares_agg", pa.int64()),
+    ("shares_sole_vote", pa.int64()),
+    ("shares_shared_vote", pa.int64()),
+    ("shares_sole_dispositive", pa.int64()),
+    ("shares_shared_dispositive", pa.int64()),
+    ("shares_percentage", pa.float64()),
+])
+# Version of each cached field: the version of its method and of the text it is extracted from. The
+# methods without a version (find_file_type only depends on the file path) are always computed.
+VERSIONS = {column: f"{getattr(FileSec, method).version}.{normalizer_version}"
+            for column, method in FIELDS.items() if hasattr(getattr(FileSec, method), "version")}
+
 
 # Define a function that will parse each file.
-def parse(file):
-
-    FileSec1 = FileSec(file)
-    return {
-        "file_path": file,
-        "file_type": FileSec1.find_file_type(),
-        "date_issue": FileSec1.find_issue_date(),
-        "date_transaction": FileSec1.find_transaction_date(),
-        "cusips": FileSec1.find_cusip(),
-        "company": FileSec1.find_company_name(),
-        "cik": FileSec1.find_company_cik(),
-        "owner": FileSec1.find_owner_name(),
-        "cik_owner": FileSec1.find_owner_cik(),
-        "shares_agg": FileSec1.find_nb_shares_agg(),
-        "shares_sole_vote": FileSec1.find_nb_shares_sole_voting(),
-        "shares_shared_vote": FileSec1.find_nb_shares_shared_voting(),
-        "shares_sole_dispositive": FileSec1.find_nb_shares_sole_dispositive(),
-        "shares_shared_dispositive": FileSec1.find_nb_shares_shared_dispositive(),
-        "shares_percentage": FileSec1.find_percentage_owned()
-    }
+def parse(file, result_cache=None, profile=False):
+    """
+    Returns the row of a filing, the (file hash, field, version, value) of the values computed
+    that the main process adds to the result cache, and with profile the time of each step (see
+    extraction_profile.py, None otherwise). The values of the result cache are reused, and the
+    filing is only parsed if one of them is missing.
+    """
+    file_hash = None
+    known = {}
+    if result_cache is not None:
+        try:
+            file_hash = filing_hash(file)
+        except FileNotFoundError:
+            pass
+        else:
+            known = worker_cache(result_cache).lookup(file_hash, VERSIONS)
+
+    FileSec1 = None
+    row = {"file_path": file}
+    computed = []
+    timings = {} if profile else None
+    for column, method in FIELDS.items():
+        if column in known:
+            row[column] = known[column]
+            continue
+        if FileSec1 is None:
+            if profile:
+                start = time.perf_counter()
+                FileSec1 = FileSec(file)
+                # The text of the cover page, unless only find_file_type is called.
+                if FileSec1.header is not None and any(field not in known for field in VERSIONS):
+                    FileSec1.cover
+                timings["read"] = time.perf_counter() - start
+            else:
+                FileSec1 = FileSec(file)
+        if profile:
+            start = time.perf_counter()
+            row[column] = getattr(FileSec1, method)()
+            timings[method] = time.perf_counter() - start
+        else:
+            row[column] = getattr(FileSec1, method)()
+        if file_hash is not None and column in VERSIONS:
+            computed.append((file_hash, column, VERSIONS[column], row[column]))
+    if profile:
+        return row, computed, profile_record(file, row["file_type"], FileSec1, timings)
+    return row, computed, None
 
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default='17_data_new/public_file_data',
+                        help='csv listing the filings to parse (file_path column), e.g. 17_data_new/public_file_data_crsp '
+                             'written by prefilter_crsp.py')
+    parser.add_argument('--text-cache', default=None,
+                        help='SQLite file caching the text of the filings between runs, e.g. 17_data_new/text_cache.sqlite')
+    parser.add_argument('--text-cache-size', type=int, default=2 * 1024 ** 3,
+                        help='size of the text cache in bytes, the least recently used filings are removed above it')
+    parser.add_argument('--result-cache', default=None,
+                        help='SQLite file keeping the values of each filing and field, e.g. 17_data_new/result_cache.sqlite. '
+                             'Only the fields whose extractor version changed are computed again.')
+    parser.add_argument('--parts-dir', default='17_data_new/shares_owned_parts',
+                        help='folder of the part files written during the run, a run started again skips the filings they hold')
+    parser.add_argument('--batch-size', type=int, default=5000, help='number of rows per part file')
+    parser.add_argument('--restart', action='store_true', help='discard the part files of a former run')
+    parser.add_argument('--workers', type=int, default=4, help='number of worker processes')
+    parser.add_argument('--chunksize', type=int, default=16, help='number of filings sent to a worker at once')
+    parser.add_argument('--timeout', type=float, default=300,
+                        help='seconds a filing can take before its worker is replaced and the filing quarantined')
+    parser.add_argument('--max-tasks-per-child', type=int, default=1000,
+                        help='number of filings after which a worker is replaced')
+    parser.add_argument('--max-memory', type=int, default=None,
+                        help='memory of a worker in bytes above which it is replaced (requires psutil)')
+    parser.add_argument('--profile', action='store_true',
+                        help='time each extractor on each filing, see extraction_profile.py')
+    parser.add_argument('--top', type=int, default=20, help='number of slowest filings reported with --profile')
+    args = parser.parse_args()
+    if args.text_cache:
+        # Set before the workers are started, they open the cache themselves.
+        text_cache.configure(args.text_cache, args.text_cache_size)
+    results_db = ResultCache(args.result_cache) if args.result_cache else None
+
     start = time.time()
-    public_data = pd.read_csv('17_data_new/public_file_data')
+    public_data = pd.read_csv(args.input)
     # public_data = public_data.iloc[0:5000]
     files = public_data['file_path'].to_list()
 
-    with Pool(4) as p:
-        # results = p.map(parse, files)
-        results = list(tqdm(p.imap_unordered(parse, files), total=len(files)))
+    # The filings that timed out or crashed a worker, with the reason.
+    quarantine_path = '17_data_new/shares_owned.quarantine.csv'
+    profile_path = '17_data_new/shares_owned.profile.csv'
+    if args.restart and os.path.isdir(args.parts_dir):
+        shutil.rmtree(args.parts_dir)
+    if not os.path.isdir(args.parts_dir):
+        # A new run, the files of the former one are replaced.
+        for path in [quarantine_path, profile_path]:
+            if os.path.exists(path):
+                os.remove(path)
+    writer = PartWriter(args.parts_dir, SCHEMA, args.batch_size)
+    if writer.done:
+        print(f'{len(writer.done)} filings already parsed in {args.parts_dir}.')
+    # A resumed run doesn't try the quarantined filings again.
+    skipped = writer.done | load_quarantine(quarantine_path)
+    files = [file for file in files if file not in skipped]
 
-        columns = ['file_path', 'file_type', 'date_issue', 'date_transaction',
-                   'cusips', 'company', 'cik', 'owner', 'cik_owner',
-                   'shares_agg', 'shares_sole_vote', 'shares_shared_vote',
-                   'shares_sole_dispositive', 'shares_shared_dispositive', 'shares_percentage']
-        df = pd.DataFrame(results, columns=columns)
+    if args.profile:
+        profile_writer = ProfileWriter(profile_path, FIELDS.values())
 
-    df.to_csv('17_data_new/shares_owned')
+    executor = ParseExecutor(partial(parse, result_cache=args.result_cache, profile=args.profile), workers=args.workers,
+                             timeout=args.timeout, chunksize=args.chunksize,
+                             max_tasks_per_child=args.max_tasks_per_child, max_memory=args.max_memory,
+                             quarantine_path=quarantine_path)
+    try:
+        for row, computed, record in tqdm(executor.imap_unordered(files), total=len(files)):
+            writer.write(row)
+            if record is not None:
+                profile_writer.write(record)
+            if results_db is not None and computed:
+                results_db.store(computed)
+            if not writer.rows and results_db is not None:
+                # A part was just written, the values it holds are committed with it.
+                results_db.commit()
+    finally:
+        # On a crash or a Ctrl-C, the rows received are kept for the next run.
+        writer.flush()
+        if results_db is not None:
+            results_db.commit()
+        if args.profile:
+            profile_writer.close()
+
+    rows = writer.finalize('17_data_new/shares_owned.parquet')
+    print(f'{rows} rows written to 17_data_new/shares_owned.parquet.')
+    if executor.quarantined:
+        print(f'{executor.quarantined} filings quarantined, see {quarantine_path}.')
+    if results_db is not None:
+        results_db.prune(VERSIONS)
+        results_db.close()
+    if args.text_cache:
+        cache = text_cache.TextCache(args.text_cache, args.text_cache_size)
+        cache.evict()
+        cache.close()
 
     time = time.time() - start
     print(f'It took {time} seconds.')
-
+    if args.profile:
+        print()
+        report(profile_path, args.top)
\ No newline at end of file
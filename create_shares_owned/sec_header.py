@@ -0,0 +1,112 @@
+# SGML header of the filings, shared by cusip_parser.py and filing_parser.py.
+#
+# Each filing of the SEC Archives starts with a <SEC-HEADER> block of labelled lines:
+#   ACCESSION NUMBER:		0000950123-05-000002
+#   CONFORMED SUBMISSION TYPE:	SC 13G
+#   FILED AS OF DATE:		20050210
+#   SUBJECT COMPANY:
+#   	COMPANY DATA:
+#   		COMPANY CONFORMED NAME:			SUBSIDIARY INC
+#   		CENTRAL INDEX KEY:			0000300000
+#   		STANDARD INDUSTRIAL CLASSIFICATION:	SERVICES-PREPACKAGED SOFTWARE [7372]
+#   FILED BY:
+#   	...
+# Loose files are memory-mapped and only the bytes up to </SEC-HEADER> are decoded, whatever the size
+# of the filing. Filings packed in a shard are read by chunks until the end of the header.
+
+import mmap
+import os
+from filing_store import decode_filing, locate, open_filing
+
+header_ends = [b'</SEC-HEADER>', b'</IMS-HEADER>', b'<DOCUMENT>']
+
+
+def header_end(buffer, limit=None):
+    """
+    Returns the offset of the end of the header in a bytes-like buffer (bytes or mmap): after the
+    closing </SEC-HEADER> tag, or at the first <DOCUMENT> for the filings without one. None if neither
+    is in the first `limit` bytes.
+    """
+    limit = len(buffer) if limit is None else min(limit, len(buffer))
+    for tag in header_ends:
+        position = buffer.find(tag, 0, limit)
+        if position != -1:
+            return position + len(tag) if tag != b'<DOCUMENT>' else position
+    return None
+
+
+def parse_sec_header(text):
+    """
+    This function returns the record of a header given as text.
+    Returns a dict with the keys:
+    - accession, form_type, filed_date (YYYYMMDD): as written in the header, None if missing.
+    - subject_company: dict with the cik, name and sic of the SUBJECT COMPANY, None if missing.
+    - filed_by: list of such dicts, one per FILED BY entity, in order.
+    The ciks are kept as written (with the leading zeros), the sic is the code between brackets.
+    """
+    record = {'accession': None, 'form_type': None, 'filed_date': None, 'subject_company': None, 'filed_by': []}
+    labels = {'ACCESSION NUMBER': 'accession', 'CONFORMED SUBMISSION TYPE': 'form_type',
+              'FILED AS OF DATE': 'filed_date'}
+    entity_labels = {'COMPANY CONFORMED NAME': 'name', 'CENTRAL INDEX KEY': 'cik',
+                     'STANDARD INDUSTRIAL CLASSIFICATION': 'sic'}
+    entity = None
+    for line in text.splitlines():
+        label, colon, value = line.partition(':')
+        if not colon:
+            continue
+        label = label.strip().upper()
+        value = value.strip()
+        if label == 'SUBJECT COMPANY' or label == 'FILED BY':
+            entity = {'cik': None, 'name': None, 'sic': None}
+            if label == 'FILED BY':
+                record['filed_by'].append(entity)
+            elif record['subject_company'] is None:
+                record['subject_company'] = entity
+        elif label in labels and record[labels[label]] is None:
+            record[labels[label]] = value
+        elif label in entity_labels and entity is not None and entity[entity_labels[label]] is None:
+            if label == 'STANDARD INDUSTRIAL CLASSIFICATION':
+                value = value[value.rfind('[') + 1:value.rfind(']')] if '[' in value else value
+            entity[entity_labels[label]] = value or None
+    return record
+
+
+def header_record(buffer, limit=None):
+    """
+    Returns the record of the header found in a bytes-like buffer, with the key 'end' holding the
+    offset of the end of the header. When the end isn't found in the first `limit` bytes, they are all
+    parsed and 'end' is None.
+    """
+    end = header_end(buffer, limit)
+    size = len(buffer) if limit is None else min(limit, len(buffer))
+    record = parse_sec_header(decode_filing(buffer[:size if end is None else end]))
+    record['end'] = end
+    return record
+
+
+def read_sec_header(file_path, max_bytes=2_000_000, chunk_size=1 << 16):
+    """
+    This function returns the record of the header of a filing (see parse_sec_header).
+    Argument 1: file path, loose or packed (see filing_store.py).
+    Argument 2: the header is searched in the first max_bytes bytes at most.
+    Raises FileNotFoundError if the filing isn't stored anywhere.
+    """
+    if locate(file_path) is None and os.path.exists(file_path):
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return header_record(b'')
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return header_record(buffer, max_bytes)
+
+    data = b''
+    with open_filing(file_path, 'rb') as f:
+        while len(data) < max_bytes:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            # The tag can be split between two chunks.
+            start = max(0, len(data) - len(header_ends[0]))
+            data += chunk
+            if header_end(data[start:]) is not None:
+                break
+    return header_record(data, max_bytes)
@@ -0,0 +1,133 @@
+# On-disk cache of the text of the filings, as used by the extractors of filing_parser.py.
+#
+# Converting an HTML filing to text and normalizing its lines is the most expensive step of
+# FileSec, and its output doesn't change when an extraction rule does. The lines and the
+# normalized lines of the cover page (and of the whole filing when it had to be searched) are
+# stored compressed in a SQLite database, keyed by the sha1 of the bytes they come from and by
+# the version of the normalizer (filing_parser.normalizer_version). A filing modified, or a new
+# normalizer, gives a new key, so an entry never has to be invalidated. The least recently used
+# entries are removed once the cache exceeds its size.
+#
+# FileSec uses the cache named by the environment variable SHARES_OWNED_TEXT_CACHE, which is
+# inherited by the worker processes of scrap.py (see its --text-cache option).
+
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+
+cache_variable = 'SHARES_OWNED_TEXT_CACHE'
+cache_size_variable = 'SHARES_OWNED_TEXT_CACHE_SIZE'
+
+
+class TextCache:
+    """
+    The TextCache object stores lists of lines by key in a SQLite database.
+
+    - get: returns the (lines, normalized_lines) stored for a key, None if there are none. The
+      last use of the entry is updated.
+    - put: stores the lines of a key, compressed with zlib.
+    - evict: removes the least recently used entries until the cache holds at most max_size bytes.
+      It is called every evict_every entries stored by a process, and can be called at the end of a run.
+    """
+
+    def __init__(self, db_path, max_size=2 * 1024 ** 3, evict_every=1000):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.evict_every = evict_every
+        self.stored = 0
+        self.connection = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS texts ("
+            "key TEXT PRIMARY KEY, lines BLOB NOT NULL, normalized BLOB NOT NULL, "
+            "size INTEGER NOT NULL, used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS texts_used ON texts (used)")
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, key):
+        row = self.connection.execute("SELECT lines, normalized FROM texts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.connection.execute("UPDATE texts SET used = ? WHERE key = ?", (time.time(), key))
+        return unpack(row[0]), unpack(row[1])
+
+    def put(self, key, lines, normalized_lines):
+        lines, normalized = pack(lines), pack(normalized_lines)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO texts (key, lines, normalized, size, used) VALUES (?, ?, ?, ?, ?)",
+            (key, lines, normalized, len(lines) + len(normalized), time.time())
+        )
+        self.stored += 1
+        if self.stored % self.evict_every == 0:
+            self.evict()
+
+    def size(self):
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM texts").fetchone()[0]
+
+    def evict(self):
+        """
+        Removes the least recently used entries above max_size. Returns the number of entries removed.
+        """
+        excess = self.size() - self.max_size
+        if excess <= 0:
+            return 0
+        removed = 0
+        for key, size in self.connection.execute("SELECT key, size FROM texts ORDER BY used").fetchall():
+            if excess <= 0:
+                break
+            self.connection.execute("DELETE FROM texts WHERE key = ?", (key,))
+            excess -= size
+            removed += 1
+        return removed
+
+
+def pack(lines):
+    # The lines come from str.splitlines, they don't hold any '\n'.
+    return zlib.compress('\n'.join(lines).encode('utf-8', errors='surrogatepass'))
+
+
+def unpack(blob):
+    text = zlib.decompress(blob).decode('utf-8', errors='surrogatepass')
+    return text.split('\n') if text else []
+
+
+def cache_key(data, *parts):
+    """
+    The key of the text computed from the bytes `data` with the settings `parts` (e.g. the version
+    of the normalizer).
+    """
+    return ':'.join([hashlib.sha1(data).hexdigest()] + [str(part) for part in parts])
+
+
+open_caches = {}
+
+
+def default_cache():
+    """
+    Returns the TextCache named by the environment variable SHARES_OWNED_TEXT_CACHE, opened once per
+    process, None if the variable isn't set.
+    """
+    db_path = os.environ.get(cache_variable)
+    if not db_path:
+        return None
+    # A connection isn't shared with the processes forked after it was opened.
+    key = (db_path, os.getpid())
+    if key not in open_caches:
+        max_size = int(os.environ.get(cache_size_variable, 2 * 1024 ** 3))
+        open_caches[key] = TextCache(db_path, max_size)
+    return open_caches[key]
+
+
+def configure(db_path, max_size=None):
+    """
+    Sets the cache used by FileSec in this process and in the worker processes started afterwards.
+    """
+    os.environ[cache_variable] = db_path
+    if max_size is not None:
+        os.environ[cache_size_variable] = str(max_size)
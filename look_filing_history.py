@@ -42,7 +42,7 @@ class SharesOwned:
         pd.set_option('display.max_rows', None)
         pd.set_option('display.max_colwidth', None)
         self.file_path = file_path
-        self.data = pd.read_csv(self.file_path, dtype=str)
+        self.data = pd.read_parquet(self.file_path, dtype_backend='numpy_nullable')
 
     def head(self):
         return self.data.head()
@@ -53,6 +53,9 @@ class SharesOwned:
             subsidiary = name_to_cik(subsidiary, self.data)
         if not parent[0].isdigit():
             parent = name_to_cik(parent, self.data)
+        # The ciks are integers in shares_owned.parquet.
+        subsidiary = int(subsidiary) if subsidiary is not None else None
+        parent = int(parent) if parent is not None else None
 
         pair_data = self.data[self.data['cik'] == subsidiary]
         pair_data = pair_data[pair_data['cik_owner'] == parent]
@@ -68,6 +71,7 @@ class SharesOwned:
 
         if not comp_name[0].isdigit():
             comp_name = name_to_cik(comp_name, self.data)
+        comp_name = int(comp_name) if comp_name is not None else None
         all_files = self.data[self.data[cik] == comp_name]
         if len(all_files) > 0:
             # all_files.date_issue = pd.to_datetime(all_files)
@@ -79,7 +83,7 @@ class SharesOwned:
 
 
 if __name__ == '__main__':
-    shares_owned = SharesOwned('../17_data_new/shares_owned')
+    shares_owned = SharesOwned('../17_data_new/shares_owned.parquet')
     shares_owned.pair_story('Keebler', 'Flowers')
 
     # shares_owned.pair_story('VERITAS SOFTWARE CORP /DE/', 'SEAGATE TECHNOLOGY INC')
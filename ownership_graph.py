@@ -0,0 +1,281 @@
+# python '18_shares_owned/ownership_graph.py' '17_data_new/shares_owned.parquet' --date 2005-12-31
+
+# Graph of the ownership stakes of shares_owned: one node per cik, one edge per owner -> subsidiary pair,
+# carrying its latest stake (shares_agg, shares_percentage and date of the last filing of the pair).
+# The ciks are mapped to node ids 0..n-1 (sorted ciks, looked up with searchsorted), and the edges are
+# stored as CSR arrays: the edges from node i are child_edges[child_ptr[i]:child_ptr[i + 1]] and the edges
+# to node i parent_edges[parent_ptr[i]:parent_ptr[i + 1]]. All the filings of the edges are kept sorted
+# by (edge, date), so the stakes as of a date are found for every edge at once with searchsorted. The
+# arrays can be saved to a .npz file.
+#
+# A node is public when it is the subject company of a filing (as in find_publicly_traded_owners.py). The
+# owners of shares_owned are public by construction (public_file_data only keeps the owners that are the
+# subject company of another filing), and so are the subsidiaries, so every node is public unless the subject
+# companies are given (the cik column of cusips.parquet written by scan_corpus.py, or the cik_company column
+# of public_file_data).
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+# Dates are encoded as days since 1970 shifted by day_offset (0 when missing), the edge id in the bits
+# above day_span in the keys of the filings.
+day_offset = 1 << 19
+day_span = 1 << 21
+
+
+def to_days(dates):
+    """
+    Encoded days of a column of dates (date32, datetime64 or 'MM-DD-YYYY' text), 0 when missing.
+    """
+    if pd.api.types.is_string_dtype(dates):
+        dates = pd.to_datetime(dates, format='%m-%d-%Y', errors='coerce')
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]')
+    return np.where(np.isnat(dates), 0, dates.astype(np.int64) + day_offset)
+
+
+def to_dates(days):
+    """
+    Dates of encoded days.
+    """
+    return np.where(days == 0, np.datetime64('NaT'), (days - day_offset).astype('datetime64[D]'))
+
+
+def csr(rows, n):
+    """
+    Returns the items sorted by row and the pointers of the rows 0..n-1 in that order.
+    """
+    order = np.argsort(rows, kind='stable')
+    pointers = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=pointers[1:])
+    return order, pointers
+
+
+def expand(pointers, rows):
+    """
+    For the rows of a CSR array, returns the index in rows and the position of each of their items.
+    """
+    start = pointers[rows]
+    count = pointers[rows + 1] - start
+    index = np.repeat(np.arange(len(rows)), count)
+    positions = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count) + np.repeat(start, count)
+    return index, positions
+
+
+class OwnershipGraph:
+    """
+    The OwnershipGraph object answers the questions on the owner -> subsidiary pairs of shares_owned.
+
+    - children / parents: the subsidiaries of an owner / the owners of a subsidiary, with the latest stake.
+    - chains: the indirect holdings grandparent -> parent -> subsidiary.
+    - cross_holdings: the pairs of companies owning each other.
+    - edges_as_of: the stakes of all the pairs as of a date (last filing on or before it).
+    - save / load: the arrays of the graph in a .npz file.
+    """
+
+    arrays = ['ciks', 'public', 'owner', 'subsidiary', 'shares', 'percentage', 'first_date', 'date',
+              'child_ptr', 'child_edges', 'parent_ptr', 'parent_edges', 'history_ptr', 'history_key',
+              'history_shares', 'history_percentage']
+
+    def __init__(self, **arrays):
+        for name in self.arrays:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def from_shares_owned(cls, shares_owned, companies=None):
+        """
+        Builds the graph from the DataFrame of shares_owned.parquet (cik, cik_owner, shares_agg,
+        shares_percentage, and date_sample or date_issue).
+        companies: ciks of the subject companies of the filings, the public nodes. None marks every
+        owner and subsidiary as public.
+        """
+        date_column = 'date_sample' if 'date_sample' in shares_owned.columns else 'date_issue'
+        filings = pd.DataFrame({
+            'owner': shares_owned['cik_owner'],
+            'subsidiary': shares_owned['cik'],
+            'shares': shares_owned['shares_agg'].astype('Float64'),
+            'percentage': shares_owned['shares_percentage'].astype('Float64'),
+            'day': to_days(shares_owned[date_column]),
+        }).dropna(subset=['owner', 'subsidiary'])
+        # Parent and subsidiary with the same cik (CBS Corp) aren't pairs.
+        filings = filings[filings['owner'] != filings['subsidiary']]
+
+        owner_cik = filings['owner'].to_numpy(dtype=np.int64)
+        subsidiary_cik = filings['subsidiary'].to_numpy(dtype=np.int64)
+        ciks = np.unique(np.concatenate([owner_cik, subsidiary_cik]))
+        n = len(ciks)
+        owner = np.searchsorted(ciks, owner_cik)
+        subsidiary = np.searchsorted(ciks, subsidiary_cik)
+        if companies is None:
+            public = np.ones(n, dtype=bool)
+        else:
+            public = np.isin(ciks, np.asarray(list(companies), dtype=np.int64))
+
+        # One edge per pair (sorted by owner, subsidiary), its filings sorted by date.
+        pairs, edge = np.unique(owner * n + subsidiary, return_inverse=True)
+        day = filings['day'].to_numpy()
+        order = np.lexsort((day, edge))
+        edge, day = edge[order], day[order]
+        shares = filings['shares'].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+        percentage = filings['percentage'].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+        history_ptr = np.zeros(len(pairs) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edge, minlength=len(pairs)), out=history_ptr[1:])
+        last = history_ptr[1:] - 1
+
+        edge_owner, edge_subsidiary = pairs // n, pairs % n
+        child_edges, child_ptr = csr(edge_owner, n)
+        parent_edges, parent_ptr = csr(edge_subsidiary, n)
+
+        return cls(
+            ciks=ciks, public=public, owner=edge_owner, subsidiary=edge_subsidiary,
+            shares=shares[last], percentage=percentage[last], first_date=day[history_ptr[:-1]], date=day[last],
+            child_ptr=child_ptr, child_edges=child_edges, parent_ptr=parent_ptr, parent_edges=parent_edges,
+            history_ptr=history_ptr, history_key=edge * day_span + day, history_shares=shares,
+            history_percentage=percentage,
+        )
+
+    @classmethod
+    def read(cls, shares_owned_path, cusips_path=None):
+        """
+        Reads shares_owned.parquet, and the subject companies from cusips.parquet if its path is given.
+        """
+        companies = None
+        if cusips_path is not None:
+            companies = pd.read_parquet(cusips_path, columns=['cik'])['cik'].dropna().unique()
+        shares_owned = pd.read_parquet(shares_owned_path, dtype_backend='numpy_nullable')
+        return cls.from_shares_owned(shares_owned, companies)
+
+    def save(self, path):
+        np.savez_compressed(path, **{name: getattr(self, name) for name in self.arrays})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in cls.arrays})
+
+    def node(self, cik):
+        """
+        Returns the node id of a cik, None if it isn't in the graph.
+        """
+        i = np.searchsorted(self.ciks, int(cik))
+        return i if i < len(self.ciks) and self.ciks[i] == int(cik) else None
+
+    def edge_frame(self, edges):
+        """
+        The DataFrame of edges (array of edge ids): ciks of the owner and of the subsidiary and latest stake.
+        """
+        return pd.DataFrame({
+            'cik_owner': self.ciks[self.owner[edges]],
+            'cik': self.ciks[self.subsidiary[edges]],
+            'shares_agg': self.shares[edges],
+            'shares_percentage': self.percentage[edges],
+            'first_date': to_dates(self.first_date[edges]),
+            'date': to_dates(self.date[edges]),
+        })
+
+    def children(self, cik):
+        """
+        The subsidiaries of an owner, with the latest stake.
+        """
+        i = self.node(cik)
+        if i is None:
+            return self.edge_frame(np.empty(0, dtype=np.int64))
+        return self.edge_frame(self.child_edges[self.child_ptr[i]:self.child_ptr[i + 1]])
+
+    def parents(self, cik):
+        """
+        The owners of a subsidiary, with the latest stake.
+        """
+        i = self.node(cik)
+        if i is None:
+            return self.edge_frame(np.empty(0, dtype=np.int64))
+        return self.edge_frame(self.parent_edges[self.parent_ptr[i]:self.parent_ptr[i + 1]])
+
+    def chains(self, min_percentage=None):
+        """
+        This function returns the indirect holdings grandparent -> parent -> subsidiary: each edge parent ->
+        subsidiary joined with the edges grandparent -> parent, without cycles (grandparent != subsidiary).
+        Argument 1: minimum latest percentage of both edges, None for all the edges.
+        """
+        keep = np.ones(len(self.owner), dtype=bool) if min_percentage is None else \
+            self.percentage >= min_percentage
+        lower = np.flatnonzero(keep)
+        # The edges to the owner of each lower edge.
+        index, positions = expand(self.parent_ptr, self.owner[lower])
+        lower, upper = lower[index], self.parent_edges[positions]
+        valid = keep[upper] & (self.owner[upper] != self.subsidiary[lower])
+        lower, upper = lower[valid], upper[valid]
+        return pd.DataFrame({
+            'cik_grandparent': self.ciks[self.owner[upper]],
+            'cik_parent': self.ciks[self.owner[lower]],
+            'cik': self.ciks[self.subsidiary[lower]],
+            'percentage_grandparent': self.percentage[upper],
+            'percentage_parent': self.percentage[lower],
+        })
+
+    def cross_holdings(self):
+        """
+        The pairs of companies owning each other, once per pair: the edge a -> b (a < b) with its latest
+        stake, and the latest percentage of b -> a.
+        """
+        n = len(self.ciks)
+        # The keys of the edges are sorted (np.unique in from_shares_owned).
+        keys = self.owner * n + self.subsidiary
+        reverse = self.subsidiary * n + self.owner
+        position = np.searchsorted(keys, reverse).clip(max=max(len(keys) - 1, 0))
+        mutual = (self.owner < self.subsidiary) & (keys[position] == reverse) if len(keys) else \
+            np.zeros(0, dtype=bool)
+        edges = np.flatnonzero(mutual)
+        frame = self.edge_frame(edges)
+        frame['shares_percentage_back'] = self.percentage[position[edges]]
+        return frame
+
+    def edges_as_of(self, date, public_only=True):
+        """
+        This function returns the stake of every pair as of a date: the last filing of the pair on or
+        before it. The pairs whose first filing is after the date are left out.
+        Argument 1: the date, str or datetime.
+        Argument 2: only the pairs whose owner and subsidiary are both public.
+        """
+        day = to_days(pd.Series([pd.Timestamp(date)]))[0]
+        edges = np.arange(len(self.owner))
+        if public_only:
+            edges = edges[self.public[self.owner] & self.public[self.subsidiary]]
+        position = np.searchsorted(self.history_key, edges * day_span + day, side='right') - 1
+        # A filing of the edge, and not an undated one.
+        found = (position >= self.history_ptr[edges]) & (self.history_key[position.clip(0)] % day_span > 0)
+        edges, position = edges[found], position[found]
+        frame = self.edge_frame(edges)
+        frame['shares_agg'] = self.history_shares[position]
+        frame['shares_percentage'] = self.history_percentage[position]
+        frame['date'] = to_dates(self.history_key[position] % day_span)
+        return frame
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('shares_owned', nargs='?', default='../17_data_new/shares_owned.parquet')
+    parser.add_argument('--cusips', default=None,
+                        help='cusips.parquet written by scan_corpus.py, its ciks are the public companies')
+    parser.add_argument('--date', default=None, help='date of the public -> public pairs printed')
+    parser.add_argument('--save', default=None, help='.npz file in which the graph is saved')
+    args = parser.parse_args()
+
+    start = time.time()
+    graph = OwnershipGraph.read(args.shares_owned, args.cusips)
+    print(f'{len(graph.ciks)} ciks, {len(graph.owner)} pairs, built in {time.time() - start:.2f} seconds.')
+    if args.save:
+        graph.save(args.save)
+
+    start = time.perf_counter()
+    chains = graph.chains()
+    cross_holdings = graph.cross_holdings()
+    print(f'{len(chains)} chains, {len(cross_holdings)} cross-holdings '
+          f'({(time.perf_counter() - start) * 1000:.1f} milliseconds).')
+    if args.date:
+        start = time.perf_counter()
+        edges = graph.edges_as_of(args.date)
+        print(f'{len(edges)} public -> public pairs as of {args.date} '
+              f'({(time.perf_counter() - start) * 1000:.1f} milliseconds).')
+        print(edges)
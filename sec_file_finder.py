@@ -1,15 +1,10 @@
-from bs4 import BeautifulSoup, NavigableString
-import re
+import os
+import sys
 
-def modify_text(element):
-    for content in element.contents:
-        if isinstance(content, NavigableString):
-            # Normalize the whitespace in the text
-            new_text = ' '.join(content.strip().split())
-            content.replace_with(new_text)
-        elif content.contents:
-            # Recursively modify text in child elements
-            modify_text(content)
+# Filings can be packed in shards, they are read through create_shares_owned/filing_store.py.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create_shares_owned'))
+from filing_store import open_filing
+from html_text import html_to_text
 
 
 class TextFinder:
@@ -21,38 +16,17 @@ class TextFinder:
     def __call__(self, file_path):
 
         if self.text is None and self.html is None:
-            with open(file_path, 'r') as file:
+            with open_filing(file_path) as file:
                 text = file.read()
             print(text)
             return
 
         if self.text is None and self.html is True:
-            with open(file_path, 'r') as file:
+            with open_filing(file_path) as file:
                 text = file.read()
 
-            # Calculate newline to total character ratio
-            newline_chars = len(re.findall(r'\n', text))
-            total_chars = len(text)
-            newline_ratio = newline_chars / (total_chars if total_chars > 0 else 1)
-
-            # Parse the HTML
-            soup = BeautifulSoup(text, 'lxml')
-            modify_text(soup)
-
-            # Specify block-level elements
-            block_level_tags = ['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li', 'br', 'tr']
-
-            # Decide whether to add newlines and spaces based on newline ratio
-            print(newline_ratio)
-            if newline_ratio < 0.05:
-                for tag in soup.find_all(True):  # True gets all tags
-                    if tag.name in block_level_tags:
-                        tag.insert_after('\n')  # Add newline after block-level tags
-                    else:
-                        tag.insert_after(' ')  # Add space after all other tags
-
-            # Get text with potential modifications
-            modified_text = soup.get_text(separator='\n')
+            # Text of the HTML, one line per block (paragraph, table cell, ...)
+            modified_text = html_to_text(text)
 
             # Assign this modified text to self.text or handle as needed
             print(modified_text)
@@ -62,7 +36,7 @@ class TextFinder:
             self.nb = 10
 
         if self.text is not None:
-            with open(file_path, 'r') as file:
+            with open_filing(file_path) as file:
                 lines = file.readlines()
 
             found = False
@@ -79,7 +53,7 @@ class TextFinder:
 
 
 def simple_finder(file_path):
-    with open(file_path, 'r') as file:
+    with open_filing(file_path) as file:
         return file.read()
 
 
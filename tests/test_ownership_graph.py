@@ -0,0 +1,37 @@
+import os
+import sys
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ownership_graph import OwnershipGraph
+
+
+def shares_owned():
+    # 10 owns 20 and 30, 20 owns 30. The owner 10 is never the subsidiary of a filing.
+    return pd.DataFrame({
+        'cik_owner': [10, 10, 20, 10],
+        'cik': [20, 30, 30, 20],
+        'shares_agg': [100, 200, 300, 150],
+        'shares_percentage': [10.0, 20.0, 30.0, 15.0],
+        'date_sample': pd.to_datetime(['2001-01-01', '2002-01-01', '2003-01-01', '2004-01-01']),
+    })
+
+
+def test_owner_never_subsidiary_is_public():
+    edges = OwnershipGraph.from_shares_owned(shares_owned()).edges_as_of('2005-01-01')
+    assert sorted(zip(edges['cik_owner'], edges['cik'])) == [(10, 20), (10, 30), (20, 30)]
+    latest = edges.set_index(['cik_owner', 'cik'])['shares_agg']
+    assert latest[(10, 20)] == 150
+
+
+def test_subject_companies():
+    # 10 is the subject company of another filing (in cusips.parquet), 30 isn't.
+    graph = OwnershipGraph.from_shares_owned(shares_owned(), companies=[10, 20])
+    edges = graph.edges_as_of('2005-01-01')
+    assert list(zip(edges['cik_owner'], edges['cik'])) == [(10, 20)]
+    assert len(graph.edges_as_of('2005-01-01', public_only=False)) == 3
+
+
+def test_edges_as_of_date():
+    edges = OwnershipGraph.from_shares_owned(shares_owned()).edges_as_of('2002-06-30')
+    assert sorted(zip(edges['cik_owner'], edges['cik'], edges['shares_agg'])) == [(10, 20, 100), (10, 30, 200)]